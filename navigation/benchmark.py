@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for navigation.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import gc
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from optparse import OptionParser
+from django.conf import settings
+from django.conf.urls.defaults import patterns
+from django.core.urlresolvers import RegexURLResolver
+from lib.pynu import CompactTreeNode, TreeNode
+from router import navigation_paths
+import urls
+
+
+def _time(func, items, rounds):
+    start = time.time()
+
+    for i in xrange(rounds):
+        for item in items:
+            func(item)
+
+    return time.time() - start
+
+def bench_routing(navigation, base_view, rounds=10):
+    '''
+    Compares resolving navigation paths through the regex per page patterns
+    of urls.add_navigation against urls.add_navigation_router.
+
+    @param navigation: parsed navigation to route
+    @param base_view: module containing the "page" view
+    @param rounds: how many times each path is resolved
+    @return: returns dict containing timings in seconds
+    '''
+    paths = ['/' + path + '/' for path, template_name in
+        navigation_paths(navigation)]
+
+    regex_patterns = patterns('')
+    urls.add_navigation(regex_patterns, navigation, base_view)
+    regex_resolver = RegexURLResolver(r'^/', regex_patterns)
+
+    router_patterns = patterns('')
+    urls.add_navigation_router(router_patterns, navigation, base_view)
+    router_resolver = RegexURLResolver(r'^/', router_patterns)
+    trie = router_patterns[0].callback.trie
+
+    def route(path):
+        match = router_resolver.resolve(path)
+        trie.lookup(match.kwargs['path'])
+
+    return {
+        'paths': len(paths),
+        'rounds': rounds,
+        'patterns': len(regex_patterns),
+        'regex': _time(regex_resolver.resolve, paths, rounds),
+        'router': _time(route, paths, rounds),
+    }
+
+def _size_of(obj, seen):
+    if id(obj) in seen:
+        return 0
+
+    seen.add(id(obj))
+    ret = sys.getsizeof(obj)
+
+    if hasattr(obj, '__dict__'):
+        ret += _size_of(obj.__dict__, seen)
+
+        for value in obj.__dict__.values():
+            if isinstance(value, (list, dict)) or hasattr(value, '__slots__'):
+                ret += _size_of(value, seen)
+
+    if isinstance(obj, dict):
+        ret += sum(_size_of(value, seen) for value in obj.values()
+            if isinstance(value, list))
+
+    for cls in type(obj).__mro__:
+        for slot in cls.__dict__.get('__slots__', ()):
+            value = getattr(obj, slot, None)
+
+            if isinstance(value, (list, dict)) or hasattr(value, '__slots__'):
+                ret += _size_of(value, seen)
+
+    return ret
+
+def node_memory(node_class, count):
+    '''
+    Calculates memory taken by a tree of nodes. The tree consists of a root
+    with square root of count children each having the same amount of
+    children. Nodes themselves are counted, referenced objects are not.
+
+    @param node_class: class of the nodes
+    @param count: approximate amount of nodes in the tree
+    @return: returns bytes per node
+    '''
+    width = int(count ** 0.5)
+    root = node_class()
+    nodes = [root]
+
+    for i in xrange(width):
+        child = node_class()
+        root.children.append(child)
+        nodes.append(child)
+
+        for j in xrange(width):
+            grandchild = node_class()
+            child.children.append(grandchild)
+            nodes.append(grandchild)
+
+    seen = set()
+
+    return float(sum(_size_of(node, seen) for node in nodes)) / len(nodes)
+
+def bench_node_memory(count=10000):
+    '''
+    Compares memory use of regular and slot based tree nodes.
+
+    @param count: approximate amount of nodes in the tree
+    @return: returns dict containing bytes per node
+    '''
+    return {
+        'nodes': count,
+        'TreeNode': node_memory(TreeNode, count),
+        'CompactTreeNode': node_memory(CompactTreeNode, count),
+    }
+
+def _private_dirty():
+    ret = 0
+
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            if line.startswith('Private_Dirty:'):
+                ret += int(line.split()[1])
+
+    return ret
+
+def fork_memory(navigation, rounds=10):
+    '''
+    Measures how much private memory a forked worker gains by using the
+    navigation. The worker walks the tree, looks up every path and runs a
+    garbage collection. Compare the result before and after
+    navigation.freeze(). Works only on systems providing /proc/self/smaps.
+
+    @param navigation: parsed navigation
+    @param rounds: how many times the navigation is used
+    @return: returns increase of private dirty memory in kB or None in case
+    it could not be measured
+    '''
+    if not os.path.exists('/proc/self/smaps'):
+        return None
+
+    paths = [path for path, template_name in navigation_paths(navigation)]
+    tree = navigation.frozen or navigation
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            before = _private_dirty()
+
+            for i in xrange(rounds):
+                for node in tree.walk():
+                    node.name, node.url, node.access_mask
+
+                for path in paths:
+                    navigation.find_node(path)
+
+            gc.collect()
+
+            os.write(write_fd, str(_private_dirty() - before))
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+
+    with os.fdopen(read_fd) as f:
+        result = f.read()
+
+    return int(result) if result else None
+
+def _write(path, content):
+    directory = os.path.dirname(path)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def _write_catalog(path, messages):
+    # writes a GNU gettext catalog (.mo) containing given messages
+    messages = dict(messages)
+    messages[''] = 'Content-Type: text/plain; charset=UTF-8\n'
+    keys = sorted(messages)
+    ids = strs = ''
+    offsets = []
+
+    for key in keys:
+        offsets.append((len(ids), len(key), len(strs), len(messages[key])))
+        ids += key + '\0'
+        strs += messages[key] + '\0'
+
+    keys_start = 7 * 4 + 16 * len(keys)
+    values_start = keys_start + len(ids)
+    key_table = []
+    value_table = []
+
+    for id_offset, id_length, str_offset, str_length in offsets:
+        key_table += [id_length, keys_start + id_offset]
+        value_table += [str_length, values_start + str_offset]
+
+    _write(path, struct.pack('Iiiiiii', 0x950412de, 0, len(keys), 7 * 4,
+        7 * 4 + 8 * len(keys), 0, 0) +
+        struct.pack('%di' % len(key_table), *key_table) +
+        struct.pack('%di' % len(value_table), *value_table) + ids + strs)
+
+def generate_app(path, structures=2, bases=10, pages=10,
+        languages=('en', 'fi')):
+    '''
+    Generates a synthetic app along with its translations and templates. The
+    app consists of given amount of navigation structures, each containing
+    bases which in turn contain pages. Note that the depth of the navigation
+    is fixed by the parser. Names are translated to other languages by
+    prefixing them with the language code.
+
+    @param path: directory to generate the app into
+    @param structures: amount of navigation structures
+    @param bases: amount of bases per navigation structure
+    @param pages: amount of pages per base
+    @param languages: codes of the languages. The first one is the language
+    of the templates.
+    @return: returns path of the app
+    '''
+    app_path = os.path.join(path, 'app')
+    page_names = ['page %04d' % i for i in xrange(pages)]
+    names = set(page_names)
+
+    _write(os.path.join(app_path, '__init__.py'), '')
+    _write(os.path.join(app_path, 'views.py'), 'from navigation import views'
+        '\n\ndef page(request, template_name):\n'
+        '    return views.page(request, template_name, "denied")\n')
+
+    for i in xrange(structures):
+        navi_path = os.path.join(app_path, 'navigation_%d' % i)
+        folder_names = ['base_%d_%04d' % (i, j) for j in xrange(bases)]
+        names.update(folder_names)
+
+        _write(os.path.join(navi_path, '__init__.py'),
+            'configuration = %r\n' % {'order': tuple(folder_names)})
+
+        for folder_name in folder_names:
+            base_path = os.path.join(navi_path, folder_name)
+
+            _write(os.path.join(base_path, '__init__.py'),
+                'configuration = %r\n' % {'pages': tuple(page_names)})
+            _write(os.path.join(base_path, 'views.py'), '')
+
+            for page_name in page_names:
+                template_name = folder_name + '/' + page_name.replace(' ', '_')
+                _write(os.path.join(path, 'templates', template_name + '.html'),
+                    '<p>{{ request.path }}</p>\n')
+
+    for language in languages[1:]:
+        _write_catalog(os.path.join(path, 'locale', language, 'LC_MESSAGES',
+            'django.mo'), dict((name, language + ' ' + name)
+            for name in names))
+
+    return app_path
+
+@contextmanager
+def _quiet():
+    # the parser prints diagnostics to stdout
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+@contextmanager
+def _app_settings(path, languages):
+    from django.utils.translation import trans_real
+
+    values = {
+        'LANGUAGES': tuple((code, code) for code in languages),
+        'LOCALE_PATHS': (os.path.join(path, 'locale'), ),
+        'TEMPLATE_DIRS': (os.path.join(path, 'templates'), ),
+        'USE_I18N': True,
+    }
+    old_values = dict((name, getattr(settings, name)) for name in values)
+    modules = dict((name, module) for name, module in sys.modules.items()
+        if name == 'app' or name.startswith('app.'))
+
+    for name, value in values.items():
+        setattr(settings, name, value)
+
+    sys.path.insert(0, path)
+    trans_real._translations = {}
+
+    try:
+        yield
+    finally:
+        for name, value in old_values.items():
+            setattr(settings, name, value)
+
+        sys.path.remove(path)
+        trans_real._translations = {}
+        _forget_app()
+        sys.modules.update(modules)
+
+def _forget_app():
+    for name in sys.modules.keys():
+        if name == 'app' or name.startswith('app.'):
+            del sys.modules[name]
+
+def _parse(app_path, snapshot_path=None):
+    import structure
+
+    navigation = structure._Navigation()
+
+    with _quiet():
+        navigation.parse(app_path, snapshot_path)
+
+    return navigation
+
+def _bench_parse(app_path, rounds):
+    import structure
+
+    elapsed = 0
+
+    for i in xrange(rounds):
+        _forget_app()
+        structure.forget_view_functions('app')
+
+        start = time.time()
+        _parse(app_path)
+        elapsed += time.time() - start
+
+    return elapsed / rounds
+
+def _bench_snapshot(app_path, snapshot_path, rounds):
+    _parse(app_path, snapshot_path)
+    elapsed = 0
+
+    for i in xrange(rounds):
+        start = time.time()
+        _parse(app_path, snapshot_path)
+        elapsed += time.time() - start
+
+    return elapsed / rounds
+
+def _bench_page(navigation, base_view, rounds):
+    from django.contrib.auth.models import AnonymousUser
+    from django.contrib.sessions.backends.signed_cookies import SessionStore
+    from django.test.client import RequestFactory
+
+    resolver_patterns = patterns('')
+    urls.add_navigation(resolver_patterns, navigation, base_view)
+    resolver = RegexURLResolver(r'^/', resolver_patterns)
+    factory = RequestFactory()
+    requests = []
+
+    # pages are requested in the language of the session to avoid redirects
+    for url in navigation.get_urls():
+        for language, path in url.items():
+            request = factory.get('/' + path + '/')
+            request.session = SessionStore()
+            request.session['django_language'] = language
+            request.user = AnonymousUser()
+            requests.append(request)
+
+    def get_page(request):
+        match = resolver.resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+
+        assert response.status_code == 200, response.status_code
+
+    return _time(get_page, requests, rounds)
+
+def bench_suite(structures=2, bases=10, pages=10, languages=('en', 'fi'),
+        rounds=10):
+    '''
+    Benchmarks parsing, lookups, routing and page views of a generated app.
+    See generate_app for the parameters describing the app. The app is
+    generated into a temporary directory and removed afterwards. The
+    navigation of the process is replaced during the benchmark.
+
+    @param rounds: how many times each operation is repeated
+    @return: returns dict containing the configuration, timings in seconds
+    and memory in bytes (fork_memory in kB, see fork_memory)
+    '''
+    import structure
+
+    path = tempfile.mkdtemp()
+
+    try:
+        app_path = generate_app(path, structures, bases, pages, languages)
+
+        with _app_settings(path, languages):
+            parse_time = _bench_parse(app_path, rounds)
+            snapshot_time = _bench_snapshot(app_path,
+                os.path.join(path, 'navigation.snapshot'), rounds)
+
+            navigation = _parse(app_path)
+            old_navigation = structure._navigation
+            structure._navigation = navigation
+
+            try:
+                nodes = list(navigation.walk())
+                paths = ['/' + url + '/' for url, template_name in
+                    navigation_paths(navigation)]
+                seen = set()
+                memory = sum(_size_of(node, seen) for node in nodes)
+
+                results = {
+                    'config': {
+                        'structures': structures,
+                        'bases': bases,
+                        'pages': pages,
+                        'languages': list(languages),
+                        'rounds': rounds,
+                    },
+                    'nodes': len(nodes),
+                    'paths': len(paths),
+                    'parse': parse_time,
+                    'parse_snapshot': snapshot_time,
+                    'find_node': _time(navigation.find_node, paths, rounds),
+                    'routing': bench_routing(navigation, 'app.views', rounds),
+                    'page': _bench_page(navigation, 'app.views', rounds),
+                    'memory_per_node': float(memory) / len(nodes),
+                    'node_memory': bench_node_memory(len(nodes)),
+                }
+
+                # freezing changes the navigation so this has to come last
+                fork_results = {'unfrozen': fork_memory(navigation, rounds)}
+                navigation.freeze()
+                fork_results['frozen'] = fork_memory(navigation, rounds)
+                results['fork_memory'] = fork_results
+
+                return results
+            finally:
+                structure._navigation = old_navigation
+    finally:
+        shutil.rmtree(path)
+
+def main(argv=None):
+    '''
+    Runs bench_suite and prints its results as JSON. Settings of the project
+    given by DJANGO_SETTINGS_MODULE are used apart from the ones describing
+    the generated app.
+    '''
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--structures', type='int', default=2)
+    parser.add_option('--bases', type='int', default=10)
+    parser.add_option('--pages', type='int', default=10)
+    parser.add_option('--languages', default='en,fi',
+        help='comma separated language codes')
+    parser.add_option('--rounds', type='int', default=10)
+    options, args = parser.parse_args(argv)
+
+    print json.dumps(bench_suite(options.structures, options.bases,
+        options.pages, options.languages.split(','), options.rounds),
+        indent=4, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
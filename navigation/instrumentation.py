@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Timing of the phases of page requests.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from time import time
+from django.conf import settings
+from django.core.urlresolvers import get_callable
+from signals import page_timed
+
+def get_timer(request):
+    '''
+    Returns timer for the phases of given request. In case
+    settings.NAVIGATION_TIMING is not set, a timer doing nothing is returned.
+
+    @param request: request to time
+    @return: returns Timer or NullTimer
+    '''
+    if getattr(settings, 'NAVIGATION_TIMING', False):
+        return Timer()
+
+    return _null_timer
+
+def get_collector():
+    '''
+    Returns collector set in settings.NAVIGATION_TIMING_COLLECTOR. The
+    collector is called with the request and its timings once the request
+    has been handled.
+
+    @return: returns collector or None in case it has not been set
+    '''
+    collector = getattr(settings, 'NAVIGATION_TIMING_COLLECTOR', None)
+
+    if collector:
+        return get_callable(collector)
+
+
+class NullTimer(object):
+    timings = ()
+
+    def mark(self, phase):
+        pass
+
+    def finish(self, request):
+        pass
+
+
+class Timer(object):
+    '''
+    Records durations of consecutive phases. Each phase lasts from the
+    previous mark (or the creation of the timer) to the mark of the phase.
+    '''
+    def __init__(self):
+        self.timings = []
+        self._last = time()
+
+    def mark(self, phase):
+        '''
+        Records duration of given phase.
+
+        @param phase: name of the phase that just ended
+        '''
+        now = time()
+        self.timings.append((phase, now - self._last))
+        self._last = now
+
+    def finish(self, request):
+        '''
+        Sends signals.page_timed and passes timings to the collector. Errors
+        raised by receivers or the collector are reported but never passed
+        on to the page.
+
+        @param request: request that was timed
+
+        >>> def fail(sender, **kwargs):
+        ...     raise ValueError('receiver')
+        >>> page_timed.connect(fail)
+        >>> settings.NAVIGATION_TIMING_COLLECTOR = 'navigation.missing.collect'
+        >>> timer = Timer()
+        >>> timer.mark('render')
+        >>> timer.finish(None) # doctest: +ELLIPSIS
+        Timing fail! receiver
+        Timing fail! ...
+        >>> del settings.NAVIGATION_TIMING_COLLECTOR
+        >>> page_timed.disconnect(fail)
+        '''
+        responses = page_timed.send_robust(sender=Timer, request=request,
+            timings=self.timings)
+
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                print 'Timing fail!', response # XXX: log instead
+
+        try:
+            collector = get_collector()
+
+            if collector is not None:
+                collector(request, self.timings)
+        except Exception, e:
+            print 'Timing fail!', e # XXX: log instead
+
+_null_timer = NullTimer()
@@ -20,7 +20,9 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see http://www.gnu.org/licenses/
 """
 from graph import GraphNode
-from tree import TreeNode
+from tree import TreeNode, PRE_ORDER, POST_ORDER, BREADTH_FIRST
+from compact import CompactNode, CompactTreeNode
+from flat import FlatTree
 
 __author__ = 'Juho Vepsäläinen'
 __version__ = '0.1.1'
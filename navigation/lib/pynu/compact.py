@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, slot based node utilities.
+"""
+"""
+Pynu - Python Node Utilities
+Copyright (C) 2010 Juho Vepsäläinen
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see http://www.gnu.org/licenses/
+"""
+from node import BaseNodeContainer
+from tree import ChildContainerMixin, TreeMixin
+
+
+class CompactNodeContainer(BaseNodeContainer):
+    __slots__ = ('_nodes', '_positions', 'owner', 'name',
+        'complementary_name')
+
+
+class CompactChildContainer(ChildContainerMixin, CompactNodeContainer):
+    __slots__ = ()
+
+
+class CompactParentContainer(CompactNodeContainer):
+    __slots__ = ()
+
+    def _set_content(self, content):
+        """Sets content of the container. Note that the new content has to be
+        a CompactTreeNode.
+
+        >>> node1, node2, node3 = CompactTreeNode(), CompactTreeNode(), \\
+        ...     CompactTreeNode()
+        >>> node2.parent = node1
+        >>> node2.parent = node3
+        >>>
+        >>> assert node1.children == None
+        >>> assert node2.parent == [node3, ]
+        >>> assert node3.children == [node2, ]
+        """
+        assert isinstance(content, CompactTreeNode)
+
+        self.empty()
+        self.append(content)
+
+
+class ContainerAttribute(object):
+    """Exposes a container stored in a slot. Assignment resets content of
+    the container and creates needed links to nodes, like Node.__setattr__
+    does for regular nodes.
+
+    >>> node1, node2, node3 = CompactNode(), CompactNode(), CompactNode()
+    >>> node1.children = (node2, node3)
+    >>>
+    >>> assert node1.children == [node2, node3]
+    >>> assert node2.parents == [node1, ]
+    >>>
+    >>> node1.children = node3
+    >>>
+    >>> assert node1.children == [node3, ]
+    >>> assert node2.parents == None
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        return self.slot.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        self.slot.__get__(instance, type(instance))._set_content(value)
+
+
+class CompactNode(object):
+    """Node without an instance dictionary. Subclasses have to declare
+    additional attributes in __slots__.
+
+    >>> class NamedNode(CompactNode):
+    ...     __slots__ = ('name', )
+    >>>
+    >>> node1, node2 = NamedNode(), NamedNode()
+    >>> node1.children = node2
+    >>> node2.name = 'joe'
+    >>>
+    >>> assert node1.children.find(name='joe') == node2
+    >>> assert not hasattr(node1, '__dict__')
+    """
+    __slots__ = ('_children', '_parents')
+
+    _children_container = CompactNodeContainer
+    _children_name = 'children'
+    _parents_container = CompactNodeContainer
+    _parents_name = 'parents'
+
+    def __init__(self):
+        self._children = self._children_container(self, self._children_name,
+            self._parents_name)
+        self._parents = self._parents_container(self, self._parents_name,
+            self._children_name)
+
+CompactNode.children = ContainerAttribute(CompactNode._children)
+CompactNode.parents = ContainerAttribute(CompactNode._parents)
+
+
+class CompactTreeNode(TreeMixin, CompactNode):
+    """Tree node without an instance dictionary.
+
+    >>> node1, node2, node3 = CompactTreeNode(), CompactTreeNode(), \\
+    ...     CompactTreeNode()
+    >>> node1.children = node2
+    >>> node2.children = node3
+    >>>
+    >>> assert node3.parent == [node2, ]
+    >>> assert node3.find_root() == node1
+    >>> assert list(node1.walk()) == [node1, node2, node3]
+    >>>
+    >>>
+    >>> class ValueNode(CompactTreeNode):
+    ...     __slots__ = ('value', )
+    >>>
+    >>> node1, node2 = ValueNode(), ValueNode()
+    >>> node1.index('value')
+    >>> node2.value = 13
+    >>> node1.children = node2
+    >>>
+    >>> assert node1.lookup(value=13) == [node2, ]
+    """
+    __slots__ = ('_indexes', )
+
+    _children_container = CompactChildContainer
+    _parents_container = CompactParentContainer
+    _parents_name = 'parent'
+
+    def __init__(self):
+        super(CompactTreeNode, self).__init__()
+
+        self._indexes = None
+
+CompactTreeNode.parent = ContainerAttribute(CompactNode._parents)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Flat tree utilities.
+"""
+"""
+Pynu - Python Node Utilities
+Copyright (C) 2010 Juho Vepsäläinen
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see http://www.gnu.org/licenses/
+"""
+from array import array
+from tree import TreeNode
+
+
+class FlatTree(object):
+    """Array based index of a tree. Nodes are numbered in preorder so that
+    the descendants of each node form a contiguous range of numbers ending
+    right before the end of the subtree of the node. This makes ancestry
+    checks constant time comparisons and subtrees slices.
+
+    The index does not follow changes made to the tree. It has to be built
+    again in case the tree changes.
+
+    >>> node1, node2, node3 = TreeNode(), TreeNode(), TreeNode()
+    >>> node4, node5 = TreeNode(), TreeNode()
+    >>>
+    >>> node1.children = (node2, node5)
+    >>> node2.children = (node3, node4)
+    >>>
+    >>> tree = FlatTree(node1)
+    >>>
+    >>> assert tree.nodes == [node1, node2, node3, node4, node5]
+    >>> assert tree.node_id(node3) == 2
+    >>> assert tree.is_ancestor(node1, node4)
+    >>> assert tree.is_ancestor(node2, node4)
+    >>> assert not tree.is_ancestor(node2, node5)
+    >>> assert not tree.is_ancestor(node4, node4)
+    >>> assert tree.depth(node4) == 2
+    >>> assert tree.parent(node4) == node2
+    >>> assert tree.parent(node1) is None
+    >>> assert tree.ancestors(node4) == [node2, node1]
+    >>> assert tree.subtree(node2) == [node2, node3, node4]
+    >>> assert tree.descendants(node2) == [node3, node4]
+    """
+
+    def __init__(self, root):
+        self.nodes = []
+        self.parents = array('l')
+        self.depths = array('l')
+        self.ends = array('l')
+        self._ids = {}
+
+        stack = [(root, -1, 0)]
+
+        while stack:
+            node, parent_id, depth = stack.pop()
+
+            self._ids[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+            self.parents.append(parent_id)
+            self.depths.append(depth)
+
+            node_id = len(self.nodes) - 1
+            stack.extend((child, node_id, depth + 1)
+                for child in reversed(list(node.children)))
+
+        # subtree sizes are accumulated from the last node towards the root
+        sizes = array('l', [1]) * len(self.nodes)
+
+        for node_id in xrange(len(self.nodes) - 1, 0, -1):
+            sizes[self.parents[node_id]] += sizes[node_id]
+
+        self.ends.extend(node_id + size for node_id, size in enumerate(sizes))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node_id(self, node):
+        return self._ids[id(node)]
+
+    def is_ancestor(self, ancestor, node):
+        """Checks if ancestor is a proper ancestor of node."""
+        ancestor_id = self._ids[id(ancestor)]
+
+        return ancestor_id < self._ids[id(node)] < self.ends[ancestor_id]
+
+    def depth(self, node):
+        return self.depths[self._ids[id(node)]]
+
+    def parent(self, node):
+        parent_id = self.parents[self._ids[id(node)]]
+
+        if parent_id >= 0:
+            return self.nodes[parent_id]
+
+    def ancestors(self, node):
+        """Returns ancestors of node beginning from its parent."""
+        ret = []
+        parent_id = self.parents[self._ids[id(node)]]
+
+        while parent_id >= 0:
+            ret.append(self.nodes[parent_id])
+            parent_id = self.parents[parent_id]
+
+        return ret
+
+    def subtree(self, node):
+        """Returns node and its descendants in preorder."""
+        node_id = self._ids[id(node)]
+
+        return self.nodes[node_id:self.ends[node_id]]
+
+    def descendants(self, node):
+        node_id = self._ids[id(node)]
+
+        return self.nodes[node_id + 1:self.ends[node_id]]
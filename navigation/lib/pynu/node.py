@@ -21,19 +21,58 @@ along with this program.  If not, see http://www.gnu.org/licenses/
 """
 import re
 
+# marks the place of a removed node until the container is compacted
+_REMOVED = object()
 
-class NodeContainer(object):
+# containers up to this size are searched linearly instead of indexing them
+INDEX_THRESHOLD = 8
+
+
+class BaseNodeContainer(object):
+    """Implementation of node containers. This defines no instance layout of
+    its own so that it can be shared by both regular and slot based
+    containers.
+
+    Nodes are kept in insertion order in a list. Once the container grows
+    beyond INDEX_THRESHOLD, positions of the nodes are kept in a dict as well
+    so that membership checks, appending and removal take constant time. In
+    that case removed nodes leave a placeholder in the list. The list is
+    compacted when the nodes are accessed by position the next time."""
+    __slots__ = ()
 
     def __init__(self, owner, name, complementary_name):
-        super(NodeContainer, self).__init__()
+        super(BaseNodeContainer, self).__init__()
 
         self._nodes = list()
+        self._positions = None
         self.owner = owner
         self.name = name
         self.complementary_name = complementary_name
 
     def __getitem__(self, key):
-        return self._nodes[key]
+        """Returns item(s) at given position.
+
+        >>> node1 = Node()
+        >>> nodes = [Node() for i in range(INDEX_THRESHOLD + 2)]
+        >>>
+        >>> node1.children = nodes
+        >>> node1.children.remove(nodes[0])
+        >>>
+        >>> assert node1.children[0] == nodes[1]
+        >>> assert node1.children[-1:] == nodes[-1:]
+        """
+        return self._compact()[key]
+
+    def __iter__(self):
+        for item in self._nodes:
+            if item is not _REMOVED:
+                yield item
+
+    def __contains__(self, item):
+        if self._positions is None:
+            return item in self._nodes
+
+        return item in self._positions
 
     def __eq__(self, other):
         """Checks if container contents are equal to other.
@@ -48,10 +87,10 @@ class NodeContainer(object):
         >>> assert node1.children == [node3, ]
         >>> assert node1.children == node2.children
         """
-        if len(self._nodes) == 0 and other is None:
+        if len(self) == 0 and other is None:
             return True
 
-        return self._nodes == other
+        return self._compact() == other
 
     def ___neq__(self, other):
         """Checks if container contents are not equal to other.
@@ -67,7 +106,22 @@ class NodeContainer(object):
         return not self == other
 
     def __len__(self):
-        return len(self._nodes)
+        if self._positions is None:
+            return len(self._nodes)
+
+        return len(self._positions)
+
+    def _compact(self):
+        if self._positions is not None and \
+                len(self._nodes) != len(self._positions):
+            self._nodes = list(self)
+            self._index()
+
+        return self._nodes
+
+    def _index(self):
+        self._positions = dict((item, i) for i, item in
+            enumerate(self._nodes))
 
     def _set_content(self, content):
         """Sets content of the container.
@@ -101,12 +155,18 @@ class NodeContainer(object):
         >>>
         >>> assert len(node1.children) == 0
         >>> assert len(node2.parents) == 0
+
+        Multiple items
+
+        >>> node1, node2, node3, node4 = Node(), Node(), Node(), Node()
+        >>>
+        >>> node1.children = (node2, node3, node4)
+        >>> node1.children.empty()
+        >>>
+        >>> assert len(node1.children) == 0
+        >>> assert len(node4.parents) == 0
         """
-        for item in self._nodes:
-            self._nodes.remove(item)
-            complementary_items = getattr(item,
-                self.complementary_name)
-            complementary_items.remove(self.owner)
+        self.remove(*list(self))
 
     def append(self, *items):
         """Appends given items to container.
@@ -148,12 +208,43 @@ class NodeContainer(object):
         >>> assert node2 in node1.children
         >>> assert node3 in node1.children
         """
+        self.extend(items)
+
+    def extend(self, items):
+        """Appends items of given iterable to container.
+
+        >>> node1 = Node()
+        >>> nodes = [Node() for i in range(1000)]
+        >>>
+        >>> node1.children.extend(nodes)
+        >>> node1.children.extend(nodes)
+        >>>
+        >>> assert node1.children == nodes
+        >>> assert nodes[-1].parents == [node1, ]
+
+        Removed items can be appended again
+
+        >>> node1.children.remove(nodes[0])
+        >>> node1.children.extend(nodes[:1])
+        >>>
+        >>> assert node1.children[-1] == nodes[0]
+        >>> assert len(node1.children) == 1000
+        """
+        complementary_name = self.complementary_name
+        owner = self.owner
+
         for item in items:
-            if item not in self._nodes:
+            if item not in self:
+                if self._positions is not None:
+                    self._positions[item] = len(self._nodes)
+                elif len(self._nodes) == INDEX_THRESHOLD:
+                    self._index()
+                    self._positions[item] = len(self._nodes)
+
                 self._nodes.append(item)
-                complementary_items = getattr(item,
-                    self.complementary_name)
-                complementary_items.append(self.owner)
+                getattr(item, complementary_name).append(owner)
+
+                self._added(item)
 
     def remove(self, *items):
         """Removes given items from container.
@@ -191,11 +282,51 @@ class NodeContainer(object):
         """
         for item in items:
             if item in self:
-                self._nodes.remove(item)
+                if self._positions is None:
+                    self._nodes.remove(item)
+                else:
+                    self._nodes[self._positions.pop(item)] = _REMOVED
+
                 complementary_items = getattr(item,
                     self.complementary_name)
                 complementary_items.remove(self.owner)
 
+                self._removed(item)
+
+    def replace(self, old, new):
+        """Replaces given item with a new one keeping its position.
+
+        >>> node1, node2, node3, node4 = Node(), Node(), Node(), Node()
+        >>>
+        >>> node1.children = (node2, node3)
+        >>> node1.children.replace(node2, node4)
+        >>>
+        >>> assert node1.children == [node4, node3]
+        >>> assert node4.parents == [node1, ]
+        >>> assert len(node2.parents) == 0
+        """
+        if new in self:
+            self.remove(old)
+        else:
+            if self._positions is None:
+                index = self._nodes.index(old)
+            else:
+                index = self._positions.pop(old)
+                self._positions[new] = index
+
+            self._nodes[index] = new
+            getattr(old, self.complementary_name).remove(self.owner)
+            getattr(new, self.complementary_name).append(self.owner)
+
+            self._removed(old)
+            self._added(new)
+
+    def _added(self, item):
+        """Called after item has been linked to the container."""
+
+    def _removed(self, item):
+        """Called after item has been unlinked from the container."""
+
     def find(self, **kvargs):
         """Finds nodes matching to given rules. The idea is that the method
         seeks based on the type of the container. For example in case
@@ -255,35 +386,91 @@ class NodeContainer(object):
         >>> assert node1.children.find(name='joe') == node1
         >>> assert node1.children.find(name='jack') == node2
         """
-        found_nodes = self._recursion(kvargs, [], [])
+        found_nodes = list(self.iterfind(**kvargs))
 
         if len(found_nodes) > 0:
             return found_nodes[0] if len(found_nodes) == 1 else found_nodes
 
-    def _recursion(self, search_clauses, found_nodes, visited_nodes):
-        visited_nodes.append(self.owner)
+    def iterfind(self, limit=None, **kvargs):
+        """Finds nodes matching to given rules lazily. Rules and search order
+        are the same as in find. The nodes are yielded as they are found so
+        the search stops as soon as the caller stops consuming the results.
 
-        for node in self._nodes:
-            try:
-                if self._all_match(node, search_clauses):
-                    found_nodes.append(node)
-            except AttributeError:
-                pass
+        >>> node1, node2, node3, node4 = Node(), Node(), Node(), Node()
+        >>>
+        >>> node1.children = (node2, node3)
+        >>> node2.children = node4
+        >>>
+        >>> node2.color = 'blue'
+        >>> node3.color = 'black'
+        >>> node4.color = 'blue'
 
-            if node not in visited_nodes:
-                node_container = getattr(node, self.name)
+        All results
 
-                node_container._recursion(search_clauses, found_nodes,
-                    visited_nodes)
+        >>> assert list(node1.children.iterfind(color='^bl')) == [node2,
+        ...     node4, node3]
 
-        return found_nodes
+        Limited amount of results
+
+        >>> assert list(node1.children.iterfind(limit=2, color='^bl')) == \\
+        ...     [node2, node4]
+
+        No result
+
+        >>> assert list(node1.children.iterfind(color='red')) == []
+
+        @param limit: maximum amount of nodes to find
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        search_clauses = self._compile(kvargs)
+        visited_nodes = set([id(self.owner)])
+        containers = [iter(self)]
+        found = 0
+
+        while containers:
+            for node in containers[-1]:
+                try:
+                    matched = self._all_match(node, search_clauses)
+                except AttributeError:
+                    matched = False
+
+                if matched:
+                    yield node
+
+                    found += 1
+                    if found == limit:
+                        return
+
+                if id(node) not in visited_nodes:
+                    visited_nodes.add(id(node))
+                    containers.append(iter(getattr(node, self.name)))
+
+                    break
+            else:
+                containers.pop()
+
+    def _compile(self, search_clauses):
+        # patterns are compiled once per search instead of once per node
+        ret = []
 
-    def _all_match(self, node, search_clauses):
         for wanted_attribute, wanted_value in search_clauses.items():
-            attribute_value = getattr(node, wanted_attribute)
+            pattern = None
 
             if isinstance(wanted_value, str):
-                matched = re.match(wanted_value, attribute_value)
+                pattern = re.compile(wanted_value)
+
+            ret.append((wanted_attribute, wanted_value, pattern))
+
+        return ret
+
+    def _all_match(self, node, search_clauses):
+        for wanted_attribute, wanted_value, pattern in search_clauses:
+            attribute_value = getattr(node, wanted_attribute)
+
+            if pattern is not None:
+                matched = pattern.match(attribute_value)
             else:
                 matched = wanted_value == attribute_value
 
@@ -293,6 +480,10 @@ class NodeContainer(object):
         return True
 
 
+class NodeContainer(BaseNodeContainer):
+    pass
+
+
 class Node(object):
     _children_container = NodeContainer
     _children_name = 'children'
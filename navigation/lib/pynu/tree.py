@@ -19,8 +19,83 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see http://www.gnu.org/licenses/
 """
+from collections import deque
 from node import Node, NodeContainer
 
+PRE_ORDER = 'pre'
+POST_ORDER = 'post'
+BREADTH_FIRST = 'breadth'
+
+
+class ChildContainerMixin(object):
+    """Keeps attribute indexes of the root of the tree up to date as nodes
+    are linked to and unlinked from the tree."""
+    __slots__ = ()
+
+    def _added(self, item):
+        indexes = self.owner._find_root_indexes()
+
+        if indexes:
+            for node in item.traverse():
+                for index in indexes.values():
+                    index.add(node)
+
+    def _removed(self, item):
+        indexes = self.owner._find_root_indexes()
+
+        if indexes:
+            for node in item.traverse():
+                for index in indexes.values():
+                    index.remove(node)
+
+
+class ChildContainer(ChildContainerMixin, NodeContainer):
+    pass
+
+
+class AttributeIndex(object):
+    """Maps values of an attribute to nodes having the value. Nodes lacking
+    the attribute or having an unhashable value are not indexed."""
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self._nodes = dict()
+
+    def add(self, node):
+        try:
+            self._nodes.setdefault(getattr(node, self.attribute),
+                []).append(node)
+        except (AttributeError, TypeError):
+            pass
+
+    def remove(self, node):
+        try:
+            value = getattr(node, self.attribute)
+            nodes = self._nodes[value]
+        except (AttributeError, KeyError, TypeError):
+            return
+
+        for i, indexed_node in enumerate(nodes):
+            if indexed_node is node:
+                del nodes[i]
+
+                break
+
+        if not nodes:
+            del self._nodes[value]
+
+    def get(self, value):
+        return self._nodes.get(value, [])
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+
+    return True
+
 
 class ParentContainer(NodeContainer):
 
@@ -47,9 +122,105 @@ class ParentContainer(NodeContainer):
         self.append(content)
 
 
-class TreeNode(Node):
-    _parents_container = ParentContainer
-    _parents_name = 'parent'
+class TreeMixin(object):
+    """Tree operations shared by regular and slot based tree nodes."""
+    __slots__ = ()
+
+    def index(self, *attributes):
+        """Indexes given attributes of the nodes of the tree. This should be
+        invoked on the root. The indexes are kept up to date as nodes are
+        appended to or removed from the tree. Values of the attributes are
+        read as the nodes are linked to the tree so in case they change
+        afterwards, reindex has to be invoked.
+
+        >>> node1, node2, node3 = TreeNode(), TreeNode(), TreeNode()
+        >>> node4 = TreeNode()
+        >>>
+        >>> node1.index('name')
+        >>> node2.name, node3.name, node4.name = 'joe', 'jack', 'joe'
+        >>> node3.children = node4
+        >>> node1.children = (node2, node3)
+        >>>
+        >>> assert node1.lookup(name='joe') == [node2, node4]
+        >>>
+        >>> node3.children.remove(node4)
+        >>>
+        >>> assert node1.lookup(name='joe') == [node2, ]
+        >>> assert node1.lookup(name='jim') == []
+
+        @param attributes: names of the attributes to index
+        """
+        indexes = dict(self._indexes or {})
+
+        for attribute in attributes:
+            indexes[attribute] = AttributeIndex(attribute)
+
+        self._indexes = indexes
+        self.reindex()
+
+    def reindex(self):
+        """Rebuilds indexes of the tree."""
+        if self._indexes:
+            for attribute in self._indexes.keys():
+                self._indexes[attribute] = AttributeIndex(attribute)
+
+            for node in self.traverse():
+                for index in self._indexes.values():
+                    index.add(node)
+
+    def lookup(self, **kvargs):
+        """Finds nodes whose attributes equal to given values. Indexed
+        attributes are looked up from the indexes, the rest are checked for
+        each candidate. In case none of the attributes has been indexed, the
+        whole tree is traversed.
+
+        >>> node1, node2, node3 = TreeNode(), TreeNode(), TreeNode()
+        >>>
+        >>> node1.children = (node2, node3)
+        >>> node2.name, node2.value = 'joe', 13
+        >>> node3.name, node3.value = 'joe', 14
+        >>>
+        >>> assert node1.lookup(name='joe', value=14) == [node3, ]
+        >>>
+        >>> node1.index('name')
+        >>>
+        >>> assert node1.lookup(name='joe') == [node2, node3]
+        >>> assert node1.lookup(name='joe', value=14) == [node3, ]
+
+        @return: returns list of nodes in the order they were indexed
+        """
+        indexes = self._indexes or {}
+        candidates = None
+        unindexed_clauses = []
+
+        for attribute, value in kvargs.items():
+            if attribute in indexes and _is_hashable(value):
+                nodes = indexes[attribute].get(value)
+
+                if candidates is None:
+                    candidates = nodes
+                else:
+                    ids = set(id(node) for node in nodes)
+                    candidates = [node for node in candidates
+                        if id(node) in ids]
+            else:
+                unindexed_clauses.append((attribute, value))
+
+        if candidates is None:
+            candidates = self.traverse()
+
+        missing = object()
+
+        return [node for node in candidates if all(getattr(node, attribute,
+            missing) == value for attribute, value in unindexed_clauses)]
+
+    def _find_root_indexes(self):
+        node = self
+
+        while node.parent:
+            node = node.parent[0]
+
+        return node._indexes
 
     def find_root(self):
         """Finds the root node.
@@ -67,7 +238,7 @@ class TreeNode(Node):
         >>> assert node1a1.find_root() == node1
         """
         if self.parent:
-            return self.parent.find(parent=None)
+            return next(self.parent.iterfind(limit=1, parent=None), None)
 
         return self
 
@@ -79,20 +250,107 @@ class TreeNode(Node):
         >>>
         >>> node1.children = (node2, node5)
         >>> node2.children = (node3, node4)
-        >>> result = (node1, node3, node4, node2, node5 )
+        >>> result = (node1, node2, node3, node4, node5 )
         >>>
         >>> for i, node in enumerate(node1.walk()):
         ...    assert node == result[i], '%s %s %s' % (i, node, result[i])
         """
+        return self.traverse()
+
+    def traverse(self, order=PRE_ORDER, max_depth=None, prune=None):
+        """Traverses the nodes beginning from the current one. Traversal uses
+        an explicit stack so its cost does not depend on the depth of the
+        tree.
+
+        >>> node1, node2, node3 = TreeNode(), TreeNode(), TreeNode()
+        >>> node4, node5 = TreeNode(), TreeNode()
+        >>>
+        >>> node1.children = (node2, node5)
+        >>> node2.children = (node3, node4)
+
+        Preorder
+
+        >>> assert list(node1.traverse()) == [node1, node2, node3, node4,
+        ...     node5]
+
+        Postorder
+
+        >>> assert list(node1.traverse(POST_ORDER)) == [node3, node4, node2,
+        ...     node5, node1]
+
+        Breadth first
+
+        >>> assert list(node1.traverse(BREADTH_FIRST)) == [node1, node2,
+        ...     node5, node3, node4]
+
+        Limited depth (the current node is at depth zero)
+
+        >>> assert list(node1.traverse(max_depth=1)) == [node1, node2, node5]
+
+        Pruning skips the subtree of each node the predicate accepts
+
+        >>> assert list(node1.traverse(prune=lambda node: node is node2)) \\
+        ...     == [node1, node5]
+        >>> assert list(node1.traverse(POST_ORDER,
+        ...     prune=lambda node: node is node2)) == [node5, node1]
+
+        @param order: PRE_ORDER, POST_ORDER or BREADTH_FIRST
+        @param max_depth: depth of the deepest nodes to visit
+        @param prune: predicate of nodes to skip along with their descendants
+        """
+        if order == PRE_ORDER:
+            return self._traverse_depth_first(max_depth, prune, False)
+
+        if order == POST_ORDER:
+            return self._traverse_depth_first(max_depth, prune, True)
+
+        if order == BREADTH_FIRST:
+            return self._traverse_breadth_first(max_depth, prune)
+
+        raise ValueError('Unknown traversal order %r' % (order, ))
+
+    def _traverse_depth_first(self, max_depth, prune, post_order):
+        # nodes whose children have been pushed already are marked as
+        # expanded. In postorder they are yielded when popped again.
+        stack = [(self, 0, False)]
+
+        while stack:
+            node, depth, expanded = stack.pop()
 
-        def _walk(nodes):
-            for node in nodes:
-                for child in _walk(node.children):
-                    yield child
+            if expanded:
+                yield node
+
+                continue
+
+            if prune is not None and prune(node):
+                continue
 
+            if post_order:
+                stack.append((node, depth, True))
+            else:
                 yield node
 
-        yield self
+            if max_depth is None or depth < max_depth:
+                stack.extend((child, depth + 1, False)
+                    for child in node.children[::-1])
+
+    def _traverse_breadth_first(self, max_depth, prune):
+        queue = deque([(self, 0)])
+
+        while queue:
+            node, depth = queue.popleft()
+
+            if prune is not None and prune(node):
+                continue
 
-        for child_walk_node in _walk(self.children):
-            yield child_walk_node
+            yield node
+
+            if max_depth is None or depth < max_depth:
+                queue.extend((child, depth + 1) for child in node.children)
+
+
+class TreeNode(TreeMixin, Node):
+    _children_container = ChildContainer
+    _parents_container = ParentContainer
+    _indexes = None
+    _parents_name = 'parent'
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Middleware for navigation.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from django.http import HttpResponseRedirect
+from structure import Navigation
+from utils import translation
+from views import MIDDLEWARE, get_node_and_language
+
+
+class TranslationRedirectMiddleware(object):
+    '''
+    Redirects pages requested in a language other than the one of the user to
+    the page in the language of the user. This is done before authentication
+    and the page view. Place it after SessionMiddleware and before
+    AuthenticationMiddleware.
+
+    The language is read from the session, see utils.translation. Nothing is
+    done in case NAVIGATION_LANGUAGE_FROM_URL has been set.
+
+    >>> import sys
+    >>> from django.test.client import RequestFactory
+    >>> structure = sys.modules[Navigation.__module__]
+    >>>
+    >>> navigation = structure._Navigation()
+    >>> primary = structure.NavigationStructure('primary')
+    >>> primary.children.append(structure.Page(structure.Translated(None,
+    ...     {'en': u'gallery', 'fi': u'galleria'}), None))
+    >>> navigation.children.append(primary)
+    >>> navigation._changed()
+    >>> old_navigation, structure._navigation = structure._navigation, navigation
+    >>>
+    >>> def get(path, session):
+    ...     request = RequestFactory().get(path)
+    ...     request.session = session
+    ...     response = TranslationRedirectMiddleware().process_request(request)
+    ...     return response and response['Location']
+    >>> get('/gallery/?page=2', {'django_language': 'fi'})
+    '/galleria/?page=2'
+    >>> get('/galleria/', {'django_language': 'fi'}) is None
+    True
+    >>> get('/gallery/', {'django_language': 'en'}) is None
+    True
+    >>> session = {}
+    >>> get('/static/style.css', session) is None, session
+    (True, {})
+    >>>
+    >>> structure._navigation = old_navigation
+    '''
+    def process_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            # parameters of other requests are stored by the page view
+            return None
+
+        if translation.language_from_url() or not hasattr(request, 'session'):
+            return None
+
+        node, language = get_node_and_language(request)
+
+        # the session is not touched for other urls
+        if node is None:
+            return None
+
+        url = Navigation().get_redirect(request.path,
+            translation.get_language(request))
+
+        if url is None:
+            return None
+
+        query_string = request.META.get('QUERY_STRING')
+
+        if query_string:
+            url += '?' + query_string
+
+        return HttpResponseRedirect(url)
+
+
+class NavigationMiddleware(object):
+    '''
+    Looks up the navigation node and language of the requested path once and
+    stores them in request.navigation_node and request.navigation_language.
+    Both are None in case the path is not a navigation page. The page view
+    and the template tags use them instead of looking up the node again.
+
+    In case the language is taken from the url, the language activated by the
+    page view is restored once the response has been rendered.
+
+    >>> import sys
+    >>> from django.test.client import RequestFactory
+    >>> from views import page
+    >>> structure = sys.modules[Navigation.__module__]
+    >>>
+    >>> navigation = structure._Navigation()
+    >>> primary = structure.NavigationStructure('primary')
+    >>> primary.children.append(structure.Page(structure.Translated(None,
+    ...     {'en': u'gallery', 'fi': u'galleria'}), None))
+    >>> navigation.children.append(primary)
+    >>> navigation._changed()
+    >>> old_navigation, structure._navigation = structure._navigation, navigation
+    >>>
+    >>> request = RequestFactory().get('/galleria/')
+    >>> NavigationMiddleware().process_request(request)
+    >>> request.navigation_node is primary.children[0]
+    True
+    >>> request.navigation_language
+    'fi'
+    >>>
+    >>> request = RequestFactory().get('/wp-login.php')
+    >>> NavigationMiddleware().process_request(request)
+    >>> request.navigation_node, request.navigation_language
+    (None, None)
+    >>> page(request, 'page', 'forbidden')
+    Traceback (most recent call last):
+        ...
+    Http404
+    >>>
+    >>> structure._navigation = old_navigation
+    '''
+    def process_request(self, request):
+        setattr(request, MIDDLEWARE, True)
+        get_node_and_language(request)
+
+        return None
+
+    def process_response(self, request, response):
+        translation.restore(request)
+
+        return response
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Trie based URL routing for navigation pages.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from django.core.urlresolvers import get_callable
+from django.http import Http404
+
+# key of the value slot within a trie node. Segments are always strings so
+# this cannot clash with them.
+_VALUE = object()
+
+
+class URLTrie(object):
+    '''
+    Prefix tree that maps url paths to values. Paths are split into segments
+    at slashes so lookup cost depends only on the depth of the path.
+
+    >>> trie = URLTrie()
+    >>> trie.insert('blog/entries', 'entries')
+    >>> trie.insert('/blog/', 'blog')
+    >>> trie.insert('blog/entries/', 'other')
+    >>> len(trie)
+    2
+    >>> trie.lookup('/blog/entries/')
+    'entries'
+    >>> trie.lookup('blog')
+    'blog'
+    >>> trie.lookup('blog/drafts') is None
+    True
+    >>> trie.lookup('gallery', 'missing')
+    'missing'
+    '''
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, path, value):
+        '''
+        Inserts value to given path. Existing value of the path is kept.
+
+        @param path: path to insert (leading and trailing slashes are ignored)
+        @param value: value to associate with the path
+        '''
+        node = self._root
+
+        for segment in self._split(path):
+            node = node.setdefault(segment, {})
+
+        if _VALUE not in node:
+            node[_VALUE] = value
+            self._size += 1
+
+    def lookup(self, path, default=None):
+        '''
+        Looks up value of given path.
+
+        @param path: path to look up (leading and trailing slashes are ignored)
+        @param default: value to return in case path was not found
+        @return: returns value of the path
+        '''
+        node = self._root
+
+        for segment in self._split(path):
+            node = node.get(segment)
+
+            if node is None:
+                return default
+
+        return node.get(_VALUE, default)
+
+    def _split(self, path):
+        return path.strip('/').split('/')
+
+
+def navigation_paths(navigation):
+    '''
+    Generates paths of the navigation along with their template names.
+
+    @param navigation: navigation to generate paths of
+    @return: yields (path, template_name) tuples
+    '''
+    for url in navigation.get_urls():
+        if 'en' in url:
+            template_name = url['en']
+
+            for path in url.values():
+                yield path, template_name
+
+
+class NavigationRouter(object):
+    '''
+    View that dispatches all navigation pages through a single url pattern.
+    Pages are passed to the given view using the same template_name argument
+    as the patterns generated by urls.add_navigation. The trie is rebuilt
+    in case the navigation has been reparsed.
+    '''
+    def __init__(self, navigation, view):
+        self.navigation = navigation
+        self.view_name = view
+        self._view = None
+        self._trie = None
+        self._version = None
+
+    def __call__(self, request, path):
+        template_name = self.trie.lookup(path)
+
+        if template_name is None:
+            raise Http404
+
+        return self.view(request, template_name=template_name)
+
+    @property
+    def view(self):
+        # resolved lazily as app views may import this module
+        if self._view is None:
+            self._view = get_callable(self.view_name)
+
+        return self._view
+
+    @property
+    def trie(self):
+        version = self.navigation.version
+
+        if self._version != version:
+            self._trie = self._build_trie()
+            self._version = version
+
+        return self._trie
+
+    def _build_trie(self):
+        trie = URLTrie()
+
+        for path, template_name in navigation_paths(self.navigation):
+            trie.insert(path, template_name)
+
+        return trie
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent snapshots of parsed navigation.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import hashlib
+import json
+import os
+from django.conf import settings
+
+# bump this whenever the layout of the snapshot data changes
+VERSION = 4
+
+SOURCE_EXTENSIONS = ('.py', '.mo')
+
+
+def fingerprint(path):
+    '''
+    Calculates fingerprint of the sources the navigation is parsed from. The
+    fingerprint covers mtimes and sizes of the modules of the app and its
+    translation catalogs as well as the configured languages.
+
+    @param path: path of the app
+    @return: returns fingerprint as a hex string
+    '''
+    entries = [settings.LANGUAGES]
+
+    for source_path in (path, ) + tuple(settings.LOCALE_PATHS):
+        for root, dirs, files in os.walk(source_path):
+            dirs.sort()
+
+            for file_name in sorted(files):
+                if os.path.splitext(file_name)[1] in SOURCE_EXTENSIONS:
+                    file_path = os.path.join(root, file_name)
+                    stat = os.stat(file_path)
+
+                    entries.append((file_path, stat.st_mtime, stat.st_size))
+
+    return hashlib.md5(repr(entries)).hexdigest()
+
+def read(snapshot_path, key):
+    '''
+    Reads snapshot data.
+
+    @param snapshot_path: path of the snapshot file
+    @param key: fingerprint the snapshot has to match to
+    @return: returns data of the snapshot or None if it is missing or stale
+    '''
+    try:
+        with open(snapshot_path, 'rb') as f:
+            version, snapshot_key, data = json.load(f)
+    except Exception:
+        return None
+
+    if version != VERSION or snapshot_key != key:
+        return None
+
+    return data
+
+def write(snapshot_path, key, data):
+    '''
+    Writes snapshot data. The file is replaced atomically so that concurrently
+    starting processes never see a partial snapshot.
+
+    @param snapshot_path: path of the snapshot file
+    @param key: fingerprint of the sources data was generated from
+    @param data: data to write. Has to be serializable as JSON. Tuples are
+    read back as lists and strings as unicode
+    @raise EnvironmentError: raised in case the snapshot could not be written
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> path = os.path.join(directory, 'navigation.snapshot')
+    >>> write(path, 'key', [('primary', [])])
+    >>> read(path, 'key')
+    [[u'primary', []]]
+    >>> read(path, 'stale key') is None
+    True
+    >>> read(path + '.missing', 'key') is None
+    True
+    >>>
+    >>> try:
+    ...     write(directory, 'key', [])
+    ... except EnvironmentError:
+    ...     print 'failed'
+    failed
+    >>> os.path.exists('%s.%d.tmp' % (directory, os.getpid()))
+    False
+    '''
+    tmp_path = '%s.%d.tmp' % (snapshot_path, os.getpid())
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            json.dump((VERSION, key, data), f, separators=(',', ':'))
+
+        os.rename(tmp_path, snapshot_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        raise
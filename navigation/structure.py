@@ -28,23 +28,37 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import gc
+import hashlib
 import inspect
+import json
 import os
 import sys
+import time
 import unicodedata
-from lib.pynu import TreeNode
+from collections import namedtuple
+from lib.pynu import FlatTree, TreeNode
+import snapshot
+from signals import navigation_changed
 from django.conf import settings
 from django.utils import translation
+from django.utils.encoding import force_unicode
+
+
+def get_package_name(package_path):
+    # XXX: this expects that the app is always named as app
+    app_path = package_path.split('app' + os.sep)[-1]
+
+    return 'app.' + app_path.replace(os.sep, '.')
 
 
 class Configuration:
     options = {'pages': (), 'hidden_pages': (), 'order': (),
-        'exclusive_to': (), 'page_itself': False}
+        'exclusive_to': (), 'page_itself': False, 'parameters': None,
+        'page_parameters': {}}
 
     def __init__(self, package_path):
-        # XXX: this expects that the app is always named as app
-        app_path = package_path.split('app' + os.sep)[-1]
-        package_name = 'app.' + app_path.replace(os.sep, '.')
+        package_name = get_package_name(package_path)
 
         self.name = package_name.split('.')[-1]
 
@@ -69,23 +83,107 @@ class Configuration:
             setattr(self, option_name, option_value)
 
 
+_view_functions = {}
+
+def get_view_functions(views_module_name):
+    '''
+    Returns functions of given views module. The result is cached so that
+    the module is imported and inspected only once for all of its pages.
+
+    @param views_module_name: name of the views module
+    @return: returns dict containing functions of the module by name
+    '''
+    if views_module_name not in _view_functions:
+        functions = {}
+
+        try:
+            __import__(views_module_name)
+
+            views_module = sys.modules[views_module_name]
+            functions = dict(inspect.getmembers(views_module,
+                inspect.isfunction))
+        except ImportError as e:
+            print 'Page conf fail!', e # XXX: log instead
+
+        _view_functions[views_module_name] = functions
+
+    return _view_functions[views_module_name]
+
+def forget_view_functions(package_name):
+    for views_module_name in _view_functions.keys():
+        if views_module_name.startswith(package_name + '.'):
+            del _view_functions[views_module_name]
+
 def languages():
     return [code for code, name in settings.LANGUAGES]
 
-def translate(text, language):
-    try:
-        translation.activate(language)
-        return translation.ugettext(text)
-    except:
-        pass
+def get_catalog(language):
+    '''
+    Returns translation function of given language. Unlike
+    translation.activate this does not change the language of the thread.
+
+    @param language: code of the language
+    @return: returns ugettext of the language
+    '''
+    if settings.USE_I18N:
+        from django.utils.translation import trans_real
+
+        return trans_real.translation(language).ugettext
+
+    return translation.ugettext
+
+
+class Translator(object):
+    '''
+    Translates labels to all languages. Catalogs are loaded once and each
+    distinct label is translated only once per language.
+    '''
+    def __init__(self):
+        self._catalogs = None
+        self._translations = {}
+
+    def translate(self, item):
+        '''
+        @param item: label to translate
+        @return: returns dict containing translations by language. The dict
+        is shared between callers and must not be modified.
+        '''
+        if item not in self._translations:
+            if self._catalogs is None:
+                self._catalogs = [(language, get_catalog(language))
+                    for language in languages()]
+
+            translations = {}
+
+            for language, ugettext in self._catalogs:
+                if isinstance(item, basestring):
+                    translations[language] = ugettext(item)
+                else:
+                    translations[language] = None
+
+            self._translations[item] = translations
+
+        return self._translations[item]
+
+_translator = Translator()
+
+def reset_translator():
+    '''
+    Discards translated labels and loaded catalogs.
+    '''
+    global _translator
+
+    _translator = Translator()
 
 
 class Translated(dict):
-    def __init__(self, item):
+    def __init__(self, item, translations=None):
         super(Translated, self).__init__()
 
-        for language in languages():
-            self[language] = translate(item, language)
+        if translations is None:
+            translations = _translator.translate(item)
+
+        self.update(translations)
 
 
 class NavigationStructure(TreeNode):
@@ -100,8 +198,9 @@ class NavigationNode(TreeNode):
     def __init__(self, name):
         super(NavigationNode, self).__init__()
 
-        self.name = Translated(name)
+        self.name = name if isinstance(name, Translated) else Translated(name)
         self.view = None
+        self.folder_name = None
 
     @property
     def url(self):
@@ -109,10 +208,11 @@ class NavigationNode(TreeNode):
 
 
 class Base(NavigationNode):
-    def __init__(self, name, exclusive_to):
+    def __init__(self, name, exclusive_to, parameters=None):
         super(Base, self).__init__(name)
 
         self.exclusive_to = exclusive_to
+        self.parameters = parameters
 
 
 class Page(NavigationNode):
@@ -122,37 +222,44 @@ class Page(NavigationNode):
         self.visible = visible
 
         self._url = dict()
+        self._parameters = None
 
-        self._init_view(base_path)
-    
-    def _init_view(self, base_path):
-        # XXX: this expects that the app is always named as app
-        app_path = base_path.split('app' + os.sep)[-1]
-        views_module_name = 'app.' + app_path.replace(os.sep, '.') + '.views'
+        # the view is resolved on first access, see view
+        self._view_module_name = None
+        self._view_name = None
+        self._view_resolved = False
 
-        try:
-            __import__(views_module_name)
-        except ImportError as e:
-            print 'Page conf fail!', e # XXX: log instead
-            return
+        if base_path is not None:
+            self._view_module_name = get_package_name(base_path) + '.views'
+            # XXX: use last fragment of url instead?
+            self._view_name = self.name['en'].replace(' ', '_')
 
-        views_module = sys.modules[views_module_name]
-        funcs = inspect.getmembers(views_module, inspect.isfunction)
-        
-        def to_dict(funcs):
-            ret = {}
-            
-            for k, v in funcs:
-                ret[k] = v
-            
-            return ret
-        
-        funcs = to_dict(funcs)
+    @property
+    def view(self):
+        if not self._view_resolved:
+            self._view_resolved = True
+
+            if self._view_module_name:
+                view_functions = get_view_functions(self._view_module_name)
+                self._view = view_functions.get(self._view_name)
+
+        return self._view
+
+    @view.setter
+    def view(self, view):
+        self._view = view
+        self._view_resolved = True
 
-        # XXX: use last fragment of url instead?
-        func_name = self.name['en'].replace(' ', '_')
+    @property
+    def view_path(self):
+        # not resolved here so that dumping and freezing import no views
+        if self._view_module_name:
+            return self._view_module_name + '.' + self._view_name
 
-        self.view = funcs[func_name] if func_name in funcs else None
+    @view_path.setter
+    def view_path(self, view_path):
+        self._view_module_name, self._view_name = view_path.rsplit('.', 1)
+        self._view_resolved = False
 
     @property
     def url(self):
@@ -188,25 +295,371 @@ class Page(NavigationNode):
          else:
              return parent.exclusive_to
 
+    @property
+    def parameters(self):
+        if self._parameters is not None:
+            return self._parameters
+
+        parent = self.parent[0]
+
+        if not isinstance(parent, NavigationStructure):
+            return parent.parameters
+
+    @parameters.setter
+    def parameters(self, parameters):
+        self._parameters = parameters
+
+
+class FrozenMapping(tuple):
+    '''
+    Immutable mapping stored as a tuple of (key, value) pairs. Lookups are
+    linear so this is meant for small mappings such as translations.
+    '''
+    __slots__ = ()
+
+    def __new__(cls, mapping):
+        return super(FrozenMapping, cls).__new__(cls, sorted(mapping.items()))
+
+    def __getitem__(self, key):
+        for item_key, value in self.items():
+            if item_key == key:
+                return value
+
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def items(self):
+        return list(tuple.__iter__(self))
+
+
+class FrozenNode(namedtuple('FrozenNode', 'name url visible exclusive_to '
+        'parameters access_mask view_path folder_name children')):
+    '''
+    Immutable counterpart of navigation nodes. See _Navigation.freeze.
+    '''
+    __slots__ = ()
+
+    @property
+    def view(self):
+        if self.view_path:
+            module_name, func_name = self.view_path.rsplit('.', 1)
+
+            return get_view_functions(module_name).get(func_name)
+
+    def walk(self):
+        stack = [self]
+
+        while stack:
+            node = stack.pop()
+
+            yield node
+
+            stack.extend(reversed(node.children))
+
+
+def _assign_access_masks(root, mask, group_bits):
+    stack = [(root, mask)]
+
+    while stack:
+        node, mask = stack.pop()
+        exclusive_to = getattr(node, 'exclusive_to', ())
+
+        if exclusive_to:
+            mask = 0
+
+            for group_name in map(force_unicode, exclusive_to):
+                if group_name not in group_bits:
+                    group_bits[group_name] = 1 << len(group_bits)
+
+                mask |= group_bits[group_name]
+
+        node.access_mask = mask
+
+        stack.extend((child, mask) for child in node.children)
+
+
+class _State(object):
+    '''
+    Lookup tables derived from the navigation tree. A new state is built after
+    each change and published with a single assignment so that concurrent
+    readers never mix tables of different versions.
+    '''
+    __slots__ = ('url_index', 'redirects', 'group_bits', 'frozen',
+        'frozen_nodes', 'version', 'modified', 'digest', 'flat_tree',
+        'breadcrumbs')
+
+    def __init__(self, url_index, redirects, group_bits, frozen=None,
+            frozen_nodes=None, version=0, modified=None, digest=None):
+        self.url_index = url_index
+        self.redirects = redirects
+        self.group_bits = group_bits
+        self.frozen = frozen
+        # maps ids of mutable nodes to their frozen counterparts
+        self.frozen_nodes = frozen_nodes
+        self.version = version
+        self.modified = modified
+        self.digest = digest
+
+        # caches filled on demand
+        self.flat_tree = None
+        self.breadcrumbs = {}
+
 
 #http://code.activestate.com/recipes/52558-the-singleton-pattern-implemented-with-python/#c7
 class _Navigation(NavigationNode):
     _path = None
+    _watcher = None
 
     def __init__(self):
         super(_Navigation, self).__init__(None)
 
+        self._state = _State({}, {}, {})
+
+        self.index('name')
+
+    @property
+    def version(self):
+        return self._state.version
+
+    @property
+    def digest(self):
+        '''
+        Digest of the navigation. Unlike version this is the same in every
+        process parsing the same app. It is calculated on first use.
+        '''
+        state = self._state
+
+        if state.digest is None:
+            state.digest = hashlib.md5(json.dumps(self._dump(),
+                sort_keys=True)).hexdigest()
+
+        return state.digest
+
+    @property
+    def modified(self):
+        return self._state.modified
+
+    @property
+    def group_bits(self):
+        return self._state.group_bits
+
+    @property
+    def frozen(self):
+        return self._state.frozen
+
     def find_node(self, url):
-        url = url.strip('/')
+        node, language = self.find_node_and_language(url)
+
+        return node
+
+    def find_node_and_language(self, url):
+        '''
+        Looks up the node matching to given url.
+
+        @param url: url to look up (leading and trailing slashes are ignored)
+        @return: returns (node, language) tuple or (None, None) if not found
+        '''
+        return self._state.url_index.get(url.strip('/'), (None, None))
+
+    def _index_urls(self):
+        url_index = {}
 
         for node in self.walk():
-            for node_url in node.url.values():
-                if node_url == url:
-                    return node
+            url = node.url
+
+            # first match wins, same as when walking the tree
+            for language in languages():
+                if language in url:
+                    url_index.setdefault(url[language], (node, language))
+
+        return url_index
+
+    def get_redirect(self, url, language):
+        '''
+        Returns url of the same page in given language.
+
+        @param url: url of a page (leading and trailing slashes are ignored)
+        @param language: code of the target language
+        @return: returns absolute url or None in case url is not a page or it
+        is in the target language already
+        '''
+        return self._state.redirects.get((url.strip('/'), language))
+
+    def _index_redirects(self):
+        redirects = {}
+
+        for node in self.walk():
+            url = node.url
+
+            for source in url.values():
+                for language, target in url.items():
+                    if source != target:
+                        redirects.setdefault((source, language),
+                            '/' + target + '/')
+
+        return redirects
+
+    @property
+    def flat_tree(self):
+        '''
+        Flat index of the navigation (lib.pynu.FlatTree) for constant time
+        ancestry and depth queries. The index covers the frozen tree in case
+        the navigation has been frozen. It is rebuilt after each reparse.
+        '''
+        return self._get_flat_tree(self._state)
+
+    def _get_flat_tree(self, state):
+        flat_tree = state.flat_tree
+
+        if flat_tree is None:
+            flat_tree = state.flat_tree = FlatTree(state.frozen or self)
+
+        return flat_tree
+
+    def get_breadcrumbs(self, node, language):
+        '''
+        Returns breadcrumbs of given node. These are calculated once per node
+        and language.
+
+        In case the navigation has been frozen, nodes of the mutable tree are
+        mapped to their frozen counterparts.
+
+        @param node: node to return breadcrumbs of
+        @param language: language of the breadcrumbs
+        @return: returns tuple of (label, url) pairs beginning from the
+        topmost base and ending to the node. Url is None for bases.
+
+        >>> navigation = _Navigation()
+        >>> base = Base(Translated(None, {'en': u'blog', 'fi': u'blogi'}), ())
+        >>> base.children.append(Page(Translated(None,
+        ...     {'en': u'entries', 'fi': u'merkinnat'}), None))
+        >>> navigation.children.append(NavigationStructure('primary'))
+        >>> navigation.children[0].children.append(base)
+        >>> navigation._changed()
+        >>> page = base.children[0]
+        >>> navigation.get_breadcrumbs(page, 'fi')
+        ((u'blogi', None), (u'merkinnat', '/blogi/merkinnat'))
+        >>> navigation.freeze()
+        >>> navigation.get_breadcrumbs(page, 'en')
+        ((u'blog', None), (u'entries', '/blog/entries'))
+        >>> navigation.get_breadcrumbs(navigation.find_node('blog/entries'),
+        ...     'en')
+        ((u'blog', None), (u'entries', '/blog/entries'))
+        '''
+        state = self._state
+
+        if state.frozen_nodes is not None:
+            node = state.frozen_nodes.get(id(node), node)
+
+        key = (id(node), language)
+
+        try:
+            return state.breadcrumbs[key]
+        except KeyError:
+            pass
+
+        breadcrumbs = []
+
+        for crumb_node in [node] + self._get_flat_tree(state).ancestors(node):
+            name = crumb_node.name
+
+            # navigation structures and the root are not part of breadcrumbs
+            if isinstance(name, basestring) or not name.get(language):
+                continue
+
+            url = crumb_node.url.get(language)
+            breadcrumbs.append((name[language], '/' + url if url else None))
+
+        breadcrumbs = tuple(reversed(breadcrumbs))
+        state.breadcrumbs[key] = breadcrumbs
+
+        return breadcrumbs
+
+    def assign_access_masks(self, root=None):
+        '''
+        Assigns a bit to each group referred to by exclusive_to and sets
+        access_mask of each node to contain the bits of the groups it is
+        exclusive to. Nodes without exclusive_to inherit the mask of their
+        parent. Mask of zero means that the node is not restricted.
+
+        Groups keep the bits they have been assigned already so masks of the
+        nodes outside of root stay valid. The bits are not published before
+        the next change (see _changed).
+
+        @param root: structure or base to assign masks to. Defaults to the
+        whole navigation.
+        @return: returns dict mapping group names to their bits
+
+        >>> navigation = _Navigation()
+        >>> base = Base(Translated(None, {'en': u'blog'}), ('editors', ))
+        >>> base.children.append(Page(Translated(None, {'en': u'entries'}),
+        ...     None))
+        >>> navigation.children.append(NavigationStructure('primary'))
+        >>> navigation.children[0].children.append(base)
+        >>> navigation.assign_access_masks()
+        {u'editors': 1}
+        >>> base.access_mask, base.children[0].access_mask
+        (1, 1)
+        >>> navigation.children[0].access_mask
+        0
+        '''
+        group_bits = dict(self._state.group_bits)
+
+        _assign_access_masks(root or self, 0, group_bits)
+
+        return group_bits
+
+    def get_access_mask(self, group_names):
+        '''
+        Returns access mask matching to given groups.
+
+        @param group_names: names of the groups of the user
+        @return: returns mask to match against access_mask of nodes
+
+        >>> navigation = _Navigation()
+        >>> base = Base(Translated(None, {'en': u'blog'}), ('editors', ))
+        >>> navigation.children.append(NavigationStructure('primary'))
+        >>> navigation.children[0].children.append(base)
+        >>> navigation.children.append(NavigationStructure('secondary'))
+        >>> navigation.children[1].children.append(Base(Translated(None,
+        ...     {'en': u'help'}), ('staff', )))
+        >>> navigation._changed()
+        >>> navigation.get_access_mask(['editors']) == \\
+        ...     navigation.group_bits[u'editors']
+        True
+        >>> navigation.get_access_mask([u'editors', 'staff', 'others'])
+        3
+        >>> navigation.get_access_mask([])
+        0
+        '''
+        group_bits = self._state.group_bits
+        mask = 0
+
+        for group_name in group_names:
+            mask |= group_bits.get(force_unicode(group_name), 0)
+
+        return mask
 
     def get_navigation(self, name):
-        for navigation_structure in self.children:
-            if navigation_structure.name == name:
+        for navigation_structure in self.lookup(name=name):
+            if navigation_structure in self.children:
                 return navigation_structure
 
     def get_urls(self):
@@ -231,7 +684,18 @@ class _Navigation(NavigationNode):
 
         return ret
 
-    def parse(self, file_path):
+    def parse(self, file_path, snapshot_path=None, watch=False):
+        '''
+        Parses navigation of the app containing given path.
+
+        @param file_path: path of the app or a file within it
+        @param snapshot_path: path of a snapshot file. If given, the navigation
+        is loaded from the snapshot in case it is up to date. Otherwise the
+        navigation is parsed and the snapshot rewritten.
+        @param watch: if set, changes made to the app are reparsed
+        automatically. See watcher.Watcher. In case the process forks after
+        parsing, call parse again in each child to watch there as well.
+        '''
         def get_directory():
             return os.path.dirname(os.path.realpath(file_path))
 
@@ -240,50 +704,381 @@ class _Navigation(NavigationNode):
         else:
             path = file_path
 
-        # XXX: make this update automatically if the directory contents have changed!
         if path != self._path:
             self._path = path
 
-            self._parse()
+            self._parse(snapshot_path)
 
-    def _parse(self):
-        for navi_name in os.listdir(self._path):
-            navi_path = os.path.join(self._path, navi_name)
+        # a forked process inherits the watcher but not its threads
+        if watch and (self._watcher is None or not self._watcher.running):
+            from watcher import Watcher
+
+            self._watcher = Watcher(self)
+            self._watcher.start()
+
+    def reparse_structure(self, navi_name):
+        '''
+        Reparses given navigation structure. The structure is added or removed
+        in case it has been created or deleted since the previous parse.
+
+        @param navi_name: name of the navigation structure
+        '''
+        self._forget_modules(os.path.join(self._path, navi_name))
+
+        old_structure = self.get_navigation(navi_name)
+        new_structure = self._parse_structure(navi_name)
+        group_bits = None
+
+        if new_structure is not None:
+            # masks are set before the nodes become reachable
+            group_bits = self.assign_access_masks(new_structure)
+
+        if old_structure is None:
+            if new_structure is not None:
+                self.children.append(new_structure)
+        elif new_structure is None:
+            self.children.remove(old_structure)
+        else:
+            self.children.replace(old_structure, new_structure)
+
+        self._changed(group_bits)
+
+    def reparse_base(self, navi_name, folder_name):
+        '''
+        Reparses given base of a navigation structure. Bases not listed in
+        the order of the structure are ignored.
+
+        @param navi_name: name of the navigation structure
+        @param folder_name: name of the package of the base
+        '''
+        navigation_structure = self.get_navigation(navi_name)
+
+        if navigation_structure is None:
+            return self.reparse_structure(navi_name)
+
+        for old_base in navigation_structure.children:
+            if old_base.folder_name == folder_name:
+                base_path = os.path.join(self._path, navi_name, folder_name)
+                self._forget_modules(base_path)
+
+                new_base = self._parse_base(base_path)
+                # masks are set before the nodes become reachable
+                group_bits = self.assign_access_masks(new_base)
+
+                navigation_structure.children.replace(old_base, new_base)
+
+                self._changed(group_bits)
+
+                return
+
+    def _forget_modules(self, package_path):
+        # makes sure modules of the package are imported again while parsing
+        package_name = get_package_name(package_path)
 
-            if os.path.isdir(navi_path):
-                navigation_structure = NavigationStructure(navi_name)
+        for module_name in sys.modules.keys():
+            if module_name == package_name or \
+                    module_name.startswith(package_name + '.'):
+                del sys.modules[module_name]
 
-                conf = Configuration(navi_path)
+        forget_view_functions(package_name)
 
-                self._parse_bases(navigation_structure, conf, navi_path)
+    def freeze(self):
+        '''
+        Converts the parsed navigation to a tree of immutable FrozenNodes
+        having urls and access masks precomputed. find_node returns frozen
+        nodes afterwards. The frozen tree is available as frozen.
 
+        Call this in the master process before forking workers. Frozen nodes
+        are tuples and hold no per node dicts so workers touch fewer shared
+        pages, though the saving is modest (see benchmark.fork_memory). On
+        Python 3.7+ the objects are also moved to the permanent generation of
+        the garbage collector (gc.freeze).
+        '''
+        state = self._state
+        frozen, frozen_nodes, url_index = self._freeze_tree(self._index_urls())
+
+        self._state = _State(url_index, state.redirects, state.group_bits,
+            frozen, frozen_nodes, state.version, state.modified, state.digest)
+
+        gc.collect()
+
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    def _freeze_tree(self, url_index):
+        frozen_nodes = {}
+
+        def freeze_parameters(parameters):
+            if parameters is not None:
+                return frozenset(parameters)
+
+        def freeze_node(node):
+            name = node.name
+
+            if not isinstance(name, basestring):
+                name = FrozenMapping(name)
+
+            frozen_node = FrozenNode(name=name,
+                url=FrozenMapping(node.url),
+                visible=getattr(node, 'visible', True),
+                exclusive_to=tuple(getattr(node, 'exclusive_to', ())),
+                parameters=freeze_parameters(getattr(node, 'parameters', None)),
+                access_mask=node.access_mask,
+                view_path=getattr(node, 'view_path', None),
+                folder_name=getattr(node, 'folder_name', None),
+                children=tuple(freeze_node(child) for child in node.children))
+            frozen_nodes[id(node)] = frozen_node
+
+            return frozen_node
+
+        frozen = freeze_node(self)
+
+        return frozen, frozen_nodes, dict((url,
+            (frozen_nodes[id(node)], language))
+            for url, (node, language) in url_index.items())
+
+    def _changed(self, group_bits=None, tables=None):
+        # the tables are built on the side and published at once
+        if tables is not None:
+            group_bits, url_index, redirects, digest = self._load_tables(tables)
+        else:
+            if group_bits is None:
+                group_bits = self.assign_access_masks()
+
+            url_index = self._index_urls()
+            redirects = self._index_redirects()
+            digest = None
+
+        frozen = frozen_nodes = None
+
+        if self.frozen is not None:
+            frozen, frozen_nodes, url_index = self._freeze_tree(url_index)
+
+        self._state = _State(url_index, redirects, group_bits, frozen,
+            frozen_nodes, self._state.version + 1, time.time(), digest)
+
+        navigation_changed.send(sender=self, version=self.version)
+
+    def compile(self, snapshot_path):
+        '''
+        Writes snapshot of the parsed navigation.
+
+        @param snapshot_path: path of the snapshot file
+        '''
+        snapshot.write(snapshot_path, snapshot.fingerprint(self._path),
+            (self._dump(), self._dump_tables()))
+
+    def _parse(self, snapshot_path=None):
+        reset_translator()
+
+        if snapshot_path:
+            key = snapshot.fingerprint(self._path)
+            data = snapshot.read(snapshot_path, key)
+
+            if data is None:
+                self._parse_structures()
+                self._changed()
+
+                try:
+                    snapshot.write(snapshot_path, key,
+                        (self._dump(), self._dump_tables()))
+                except EnvironmentError as e:
+                    # the snapshot is only a cache, keep the parsed navigation
+                    print 'Snapshot fail!', e, snapshot_path # XXX: log instead
+            else:
+                navigation_data, tables = data
+
+                self._load(navigation_data)
+                self._changed(tables=tables)
+        else:
+            self._parse_structures()
+            self._changed()
+
+    def _parse_structures(self):
+        for navi_name in os.listdir(self._path):
+            navigation_structure = self._parse_structure(navi_name)
+
+            if navigation_structure is not None:
                 self.children.append(navigation_structure)
 
+    def _parse_structure(self, navi_name):
+        navi_path = os.path.join(self._path, navi_name)
+
+        if os.path.isdir(navi_path):
+            navigation_structure = NavigationStructure(navi_name)
+
+            conf = Configuration(navi_path)
+
+            self._parse_bases(navigation_structure, conf, navi_path)
+
+            return navigation_structure
+
     def _parse_bases(self, navigation_structure, conf, navi_path):
         print dir(conf)
         if conf.order:
             for folder_name in conf.order:
                 base_path = os.path.join(navi_path, folder_name)
-                conf = Configuration(base_path)
 
-                if conf.page_itself:
-                    page = Page(conf.name, base_path)
-                    navigation_structure.children.append(page)
-                else:
-                    base = Base(conf.name, conf.exclusive_to)
-                    navigation_structure.children.append(base)
-                    self._parse_pages(base, base_path, conf)
+                navigation_structure.children.append(
+                    self._parse_base(base_path))
 
         # XXX: else case: pick bases as they are found
 
+    def _parse_base(self, base_path):
+        conf = Configuration(base_path)
+
+        if conf.page_itself:
+            base = Page(conf.name, base_path)
+            base.parameters = conf.parameters
+        else:
+            base = Base(conf.name, conf.exclusive_to, conf.parameters)
+            self._parse_pages(base, base_path, conf)
+
+        base.folder_name = conf.name
+
+        return base
+
     def _parse_pages(self, base, base_path, conf):
         def append_pages(pages, visible):
             for page_name in pages:
-                base.children.append(Page(page_name, base_path, visible=visible))
+                page = Page(page_name, base_path, visible=visible)
+                page.parameters = conf.page_parameters.get(page_name)
+
+                base.children.append(page)
 
         append_pages(conf.pages, visible=True)
         append_pages(conf.hidden_pages, visible=False)
 
+    def _dump(self):
+        '''
+        Returns the navigation as builtin types for snapshots. See _load.
+
+        >>> navigation = _Navigation()
+        >>> base = Base(Translated(None, {'en': u'blog', 'fi': u'blogi'}),
+        ...     ('editors', ), ('page', ))
+        >>> base.children.append(Page(Translated(None,
+        ...     {'en': u'entries', 'fi': u'merkinnat'}), None))
+        >>> primary = NavigationStructure('primary')
+        >>> primary.children.append(base)
+        >>> navigation.children.append(primary)
+        >>> navigation._changed()
+        >>>
+        >>> loaded = _Navigation()
+        >>> loaded._load(navigation._dump())
+        >>> loaded._changed()
+        >>> loaded._dump() == navigation._dump()
+        True
+        >>> loaded.digest == navigation.digest
+        True
+        >>> page = loaded.find_node('/blogi/merkinnat/')
+        >>> page.url['en'], page.exclusive_to, page.parameters
+        ('blog/entries', ('editors',), ('page',))
+        >>>
+        >>> # snapshots store the lookup tables as well
+        >>> data, tables = json.loads(json.dumps((navigation._dump(),
+        ...     navigation._dump_tables())))
+        >>> loaded = _Navigation()
+        >>> loaded._load(data)
+        >>> loaded._changed(tables=tables)
+        >>> loaded._dump() == navigation._dump()
+        True
+        >>> loaded.digest == navigation.digest
+        True
+        >>> loaded.get_redirect('blog/entries', 'fi')
+        u'/blogi/merkinnat/'
+        >>> page, language = loaded.find_node_and_language('/blogi/merkinnat/')
+        >>> language, page.exclusive_to, page.parameters, page.access_mask
+        (u'fi', (u'editors',), (u'page',), 1)
+        '''
+        def dump_page(page):
+            return ('page', dict(page.name), dict(page.url), page.visible,
+                page.view_path, page.folder_name, page._parameters)
+
+        def dump_base(base):
+            return ('base', dict(base.name), base.exclusive_to,
+                [dump_page(page) for page in base.children], base.folder_name,
+                base.parameters)
+
+        def dump_node(node):
+            return dump_page(node) if isinstance(node, Page) else \
+                dump_base(node)
+
+        return [(navigation_structure.name,
+            [dump_node(node) for node in navigation_structure.children])
+            for navigation_structure in self.children]
+
+    def _dump_tables(self):
+        '''
+        Returns the lookup tables and the digest of the navigation as builtin
+        types for snapshots. Nodes are referred to by their position in the
+        tree in preorder. See _load_tables.
+        '''
+        state = self._state
+        nodes = list(self.walk())
+        positions = dict((id(node), i) for i, node in enumerate(nodes))
+
+        if state.frozen is not None:
+            positions.update((id(node), i)
+                for i, node in enumerate(state.frozen.walk()))
+
+        return {
+            'url_index': [(url, positions[id(node)], language)
+                for url, (node, language) in state.url_index.items()],
+            'redirects': [(source, language, target)
+                for (source, language), target in state.redirects.items()],
+            'group_bits': state.group_bits,
+            'access_masks': [node.access_mask for node in nodes],
+            'digest': self.digest,
+        }
+
+    def _load_tables(self, tables):
+        nodes = list(self.walk())
+
+        for node, mask in zip(nodes, tables['access_masks']):
+            node.access_mask = mask
+
+        url_index = dict((url, (nodes[position], language))
+            for url, position, language in tables['url_index'])
+        redirects = dict(((source, language), target)
+            for source, language, target in tables['redirects'])
+
+        return tables['group_bits'], url_index, redirects, tables['digest']
+
+    def _load(self, data):
+        def load_parameters(parameters):
+            if parameters is not None:
+                return tuple(parameters)
+
+        def load_page(data):
+            kind, name, url, visible, view_path, folder_name, parameters = data
+
+            page = Page(Translated(None, name), None, visible=visible)
+            page._url = url
+            page.folder_name = folder_name
+            page.parameters = load_parameters(parameters)
+
+            if view_path:
+                page.view_path = view_path
+
+            return page
+
+        def load_base(data):
+            kind, name, exclusive_to, pages, folder_name, parameters = data
+
+            base = Base(Translated(None, name), tuple(exclusive_to),
+                load_parameters(parameters))
+            base.folder_name = folder_name
+            base.children.append(*[load_page(page) for page in pages])
+
+            return base
+
+        for navi_name, nodes in data:
+            navigation_structure = NavigationStructure(navi_name)
+            navigation_structure.children.append(*[load_page(node)
+                if node[0] == 'page' else load_base(node) for node in nodes])
+
+            self.children.append(navigation_structure)
+
 _navigation = _Navigation()
 
 def Navigation():
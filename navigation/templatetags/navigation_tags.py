@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Template tags for rendering navigation.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from django import template
+from django.conf import settings
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from navigation.signals import navigation_changed
+from navigation.structure import Navigation
+from navigation.utils.cache import LRUCache
+from navigation.views import get_access_mask, get_node_and_language
+from navigation.views import get_page_language
+
+register = template.Library()
+
+_menus = LRUCache(getattr(settings, 'NAVIGATION_MENU_CACHE_SIZE', 128))
+
+@register.simple_tag(takes_context=True)
+def navigation_menu(context, name):
+    '''
+    Renders visible pages and bases of given navigation structure the user is
+    allowed to access as a list. Rendered menus are cached per navigation,
+    language, access mask and active node until the navigation changes.
+
+    @param context: template context containing request
+    @param name: name of the navigation structure to render
+    @return: returns rendered menu or an empty string in case there is no
+    such navigation structure
+
+    >>> import sys
+    >>> from django.contrib.auth.models import AnonymousUser
+    >>> from django.template import Context, Template
+    >>> from django.test.client import RequestFactory
+    >>> from navigation.utils.auth import GROUP_NAMES
+    >>> structure = sys.modules[Navigation.__module__]
+    >>>
+    >>> navigation = structure._Navigation()
+    >>> top = structure.NavigationStructure('top')
+    >>> top.children.append(structure.Page(structure.Translated(None,
+    ...     {'en': u'faq', 'fi': u'ukk'}), None))
+    >>> top.children.append(structure.Base(structure.Translated(None,
+    ...     {'en': u'blog', 'fi': u'blogi'}), ('editors', )))
+    >>> navigation.children.append(top)
+    >>> navigation._changed()
+    >>> old_navigation, structure._navigation = structure._navigation, navigation
+    >>>
+    >>> def render(path, group_names=(), name='top'):
+    ...     request = RequestFactory().get(path)
+    ...     request.session = {'django_language': 'fi'}
+    ...     request.user = AnonymousUser()
+    ...     setattr(request, GROUP_NAMES, frozenset(group_names))
+    ...     return Template('{% load navigation_tags %}'
+    ...         '{% navigation_menu "' + name + '" %}').render(Context({
+    ...         'request': request}))
+    >>> print render('/ukk/')
+    <ul id="top_navigation"><li class="active"><a href="/ukk">Ukk</a></li></ul>
+    >>> 'Blogi' in render('/ukk/'), 'Blogi' in render('/ukk/', ['editors'])
+    (False, True)
+    >>> render('/ukk/', name='missing')
+    u''
+    >>>
+    >>> structure._navigation = old_navigation
+    >>> _clear_menus(None)
+    '''
+    request = context.get('request')
+
+    if request is None:
+        # like other template errors this fails silently unless debugging
+        if settings.TEMPLATE_DEBUG:
+            raise template.TemplateSyntaxError('navigation_menu requires '
+                'request in the context. Enable the request context processor.')
+
+        return ''
+
+    navi = Navigation()
+    navigation = _get_structure(navi, name)
+
+    if navigation is None:
+        return ''
+
+    lang = get_page_language(request)
+    mask = get_access_mask(request)
+    active = _get_active_nodes(navi, request)
+    key = (name, lang, mask, active, navi.version)
+
+    menu = _menus.get(key)
+
+    if menu is None:
+        menu = mark_safe(render_menu(navigation, lang, mask, active))
+        _menus.set(key, menu)
+
+    return menu
+
+def render_menu(navigation, lang, mask, active=()):
+    '''
+    Renders children of given navigation structure as a list.
+
+    @param navigation: navigation structure to render
+    @param lang: language of the menu
+    @param mask: access mask of the user
+    @param active: ids of nodes to mark active
+    @return: returns rendered menu
+    '''
+    items = []
+
+    for node in navigation.children:
+        if not getattr(node, 'visible', True):
+            continue
+
+        if node.access_mask and not node.access_mask & mask:
+            continue
+
+        attrs = ' class="active"' if id(node) in active else ''
+        url = node.url.get(lang)
+        label = escape(node.name[lang].capitalize())
+
+        if url:
+            label = '<a href="/%s">%s</a>' % (escape(url), label)
+
+        items.append('<li%s>%s</li>' % (attrs, label))
+
+    return '<ul id="%s_navigation">%s</ul>' % (escape(navigation.name),
+        ''.join(items))
+
+def _get_structure(navi, name):
+    for navigation in (navi.frozen or navi).children:
+        if navigation.name == name:
+            return navigation
+
+def _get_active_nodes(navi, request):
+    node, language = get_node_and_language(request)
+
+    if node is None:
+        return frozenset()
+
+    try:
+        ancestors = navi.flat_tree.ancestors(node)
+    except KeyError:
+        # the navigation changed after the node was looked up
+        return frozenset()
+
+    # bases containing the current page are considered active as well
+    return frozenset(id(node) for node in [node] + ancestors)
+
+def _clear_menus(sender, **kwargs):
+    _menus.clear()
+
+navigation_changed.connect(_clear_menus,
+    dispatch_uid='navigation.templatetags.navigation_tags')
@@ -29,6 +29,7 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 from django.conf.urls.defaults import patterns
+from router import NavigationRouter, navigation_paths
 
 def add_structure(urlpatterns):
     '''
@@ -47,9 +48,20 @@ def add_frontpage(urlpatterns, frontpage_view):
 
 # XXX: sort out redirection (from base to page)
 def add_navigation(urlpatterns, navigation, base_view):
-    for url in navigation.get_urls():
-        if 'en' in url:
-            template_name = url['en']
-            for path in url.values():
-                urlpatterns += patterns(base_view, (r'^' + path + '/$', 'page',
-                    {'template_name': template_name}), )
+    for path, template_name in navigation_paths(navigation):
+        urlpatterns += patterns(base_view, (r'^' + path + '/$', 'page',
+            {'template_name': template_name}), )
+
+def add_navigation_router(urlpatterns, navigation, base_view):
+    '''
+    Adds a single catch-all pattern to urlpatterns. Navigation pages are
+    dispatched through a trie instead of a regex per page and language. This
+    should be added after all other patterns of the app.
+
+    @param urlpatterns: urlpatterns to add router into
+    @param navigation: navigation to route
+    @param base_view: module containing the "page" view
+    '''
+    router = NavigationRouter(navigation, base_view + '.page')
+
+    urlpatterns += patterns('', (r'^(?P<path>.+)/$', router), )
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+File for user group lookups.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and 
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+GROUP_NAMES = '_navigation_group_names'
+CACHE_KEY = 'navigation.group_names.%s.%s'
+CACHE_VERSION_KEY = 'navigation.group_names.version'
+
+def get_group_names(request):
+    '''
+    Returns names of the groups the user of the request belongs to. The names
+    are fetched only once per request. In addition they are cached for
+    settings.NAVIGATION_GROUP_CACHE_TIMEOUT seconds should it be set.
+
+    @param request: request to fetch group names for
+    @return: returns frozenset of group names
+    '''
+    if not hasattr(request, GROUP_NAMES):
+        setattr(request, GROUP_NAMES, fetch_group_names(request.user))
+
+    return getattr(request, GROUP_NAMES)
+
+def fetch_group_names(user):
+    '''
+    Fetches names of the groups of given user, using the cache if enabled.
+
+    @param user: user to fetch group names for
+    @return: returns frozenset of group names
+    '''
+    if user.id is None:
+        return frozenset()
+
+    timeout = getattr(settings, 'NAVIGATION_GROUP_CACHE_TIMEOUT', None)
+
+    if not timeout:
+        return _query_group_names(user)
+
+    key = _cache_key(user.id)
+    group_names = cache.get(key)
+
+    if group_names is None:
+        group_names = _query_group_names(user)
+        cache.set(key, group_names, timeout)
+
+    return group_names
+
+def _query_group_names(user):
+    return frozenset(user.groups.values_list('name', flat=True))
+
+def _cache_key(user_id):
+    return CACHE_KEY % (cache.get(CACHE_VERSION_KEY, 0), user_id)
+
+def _invalidate_all():
+    # renaming or deleting a group affects an unknown set of users
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1)
+
+def _membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    Drops cached group names of the users whose groups have changed.
+
+    >>> cache.set(_cache_key(1), frozenset([u'editors']))
+    >>> cache.set(_cache_key(2), frozenset([u'editors']))
+    >>> _membership_changed(None, User(pk=1), 'pre_add', False, set([1]))
+    >>> cache.get(_cache_key(1))
+    frozenset([u'editors'])
+    >>> _membership_changed(None, User(pk=1), 'post_add', False, set([1]))
+    >>> cache.get(_cache_key(1)) is None, cache.get(_cache_key(2))
+    (True, frozenset([u'editors']))
+    >>> _membership_changed(None, Group(pk=1), 'post_remove', True, set([2]))
+    >>> cache.get(_cache_key(2)) is None
+    True
+    >>> cache.set(_cache_key(3), frozenset([u'editors']))
+    >>> _membership_changed(None, Group(pk=1), 'post_clear', True, None)
+    >>> cache.get(_cache_key(3)) is None
+    True
+    '''
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        cache.delete(_cache_key(instance.pk))
+    elif pk_set is None:
+        _invalidate_all()
+    else:
+        cache.delete_many([_cache_key(user_id) for user_id in pk_set])
+
+def _group_changed(sender, **kwargs):
+    '''
+    Drops cached group names of all users as renaming or deleting a group
+    may affect any of them.
+
+    >>> cache.set(_cache_key(1), frozenset([u'editors']))
+    >>> _group_changed(Group, instance=Group(pk=1))
+    >>> cache.get(_cache_key(1)) is None
+    True
+    '''
+    _invalidate_all()
+
+m2m_changed.connect(_membership_changed, sender=User.groups.through,
+    dispatch_uid='navigation.utils.auth')
+post_save.connect(_group_changed, sender=Group,
+    dispatch_uid='navigation.utils.auth')
+post_delete.connect(_group_changed, sender=Group,
+    dispatch_uid='navigation.utils.auth')
@@ -28,8 +28,20 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+import os
+import re
+from hashlib import md5
+from django.conf import settings
+from django.http import HttpResponseNotModified
 from django.shortcuts import render_to_response
 from django.template import RequestContext
+from django.template.loader import find_template_loader
+from django.utils.http import http_date, parse_etags, quote_etag
+
+_template_paths = {}
+_template_dependencies = {}
+
+_DEPENDENCY = re.compile(r'{%\s*(?:extends|include)\s+(\S+)')
 
 def default_response(request, template_name, data=None):
     '''
@@ -47,3 +59,174 @@ def default_response(request, template_name, data=None):
     return render_to_response(template_name + '.html',
                               data,
                               context_instance=RequestContext(request))
+
+def conditional_response(request, template_name, validators, modified=None,
+        data=None):
+    '''
+    Works like default_response but returns HttpResponseNotModified in case
+    the client has the current version of the page already. The ETag of the
+    page is derived from the modification times of the template and the
+    templates it extends or includes and given validators. Only If-None-Match
+    is checked since Last-Modified does not reflect the validators. Templates
+    referring to others by a variable are always rendered.
+
+    @param request: request to response to
+    @param template_name: name of the template to render
+    @param validators: tuple of values the page depends on in addition to
+    the template
+    @param modified: time the validators last changed (seconds since epoch)
+    @param data: data provided to template should there be any
+    @return: returns HttpResponse or HttpResponseNotModified
+
+    >>> import tempfile
+    >>> from django.test.client import RequestFactory
+    >>> directory = tempfile.mkdtemp()
+    >>> with open(os.path.join(directory, 'page.html'), 'w') as f:
+    ...     f.write('page')
+    >>> template_dirs = settings.TEMPLATE_DIRS
+    >>> settings.TEMPLATE_DIRS = (directory, )
+    >>>
+    >>> factory = RequestFactory()
+    >>> response = conditional_response(factory.get('/page/'), 'page', ('en', ))
+    >>> response.status_code, response.content
+    (200, 'page')
+    >>> request = factory.get('/page/', HTTP_IF_NONE_MATCH=response['ETag'])
+    >>> conditional_response(request, 'page', ('en', )).status_code
+    304
+    >>> conditional_response(request, 'page', ('fi', )).status_code
+    200
+    >>> request = factory.post('/page/', HTTP_IF_NONE_MATCH=response['ETag'])
+    >>> conditional_response(request, 'page', ('en', )).status_code
+    200
+    >>>
+    >>> with open(os.path.join(directory, 'child.html'), 'w') as f:
+    ...     f.write('{% extends "page.html" %}')
+    >>> response = conditional_response(factory.get('/child/'), 'child', ())
+    >>> request = factory.get('/child/', HTTP_IF_NONE_MATCH=response['ETag'])
+    >>> conditional_response(request, 'child', ()).status_code
+    304
+    >>> modified = os.path.getmtime(os.path.join(directory, 'page.html'))
+    >>> os.utime(os.path.join(directory, 'page.html'), (0, modified + 1))
+    >>> conditional_response(request, 'child', ()).status_code
+    200
+    >>>
+    >>> with open(os.path.join(directory, 'dynamic.html'), 'w') as f:
+    ...     f.write('{% include page_template %}')
+    >>> 'ETag' in conditional_response(factory.get('/'), 'dynamic', ())
+    False
+    >>>
+    >>> settings.TEMPLATE_DIRS = template_dirs
+    '''
+    if request.method not in ('GET', 'HEAD'):
+        return default_response(request, template_name, data)
+
+    template_mtimes = _get_template_mtimes(template_name + '.html', set())
+
+    if template_mtimes is None:
+        return default_response(request, template_name, data)
+
+    template_modified = max(template_mtimes)
+    etag = md5(repr(tuple(template_mtimes) + tuple(validators))).hexdigest()
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = default_response(request, template_name, data)
+
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(max(template_modified, modified or 0))
+
+    return response
+
+def get_template_modified(template_name):
+    '''
+    Returns modification time of given template, taking the templates it
+    extends or includes into account. Templates are looked up using the
+    loaders of settings.TEMPLATE_LOADERS providing file paths.
+
+    @param template_name: name of the template
+    @return: returns modification time or None in case a template file was
+    not found or a template refers to another by a variable
+    '''
+    mtimes = _get_template_mtimes(template_name, set())
+
+    if mtimes is not None:
+        return max(mtimes)
+
+def _get_template_mtimes(template_name, seen):
+    if template_name in seen:
+        return []
+
+    seen.add(template_name)
+
+    path = _template_paths.get(template_name)
+
+    if path is None:
+        path = _template_paths[template_name] = _find_template(template_name)
+
+    if path is None:
+        return None
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        # the template has been moved, look it up again next time
+        del _template_paths[template_name]
+
+        return None
+
+    mtimes = [mtime]
+    dependencies = _get_template_dependencies(path, mtime)
+
+    if dependencies is None:
+        return None
+
+    for dependency in dependencies:
+        dependency_mtimes = _get_template_mtimes(dependency, seen)
+
+        if dependency_mtimes is None:
+            return None
+
+        mtimes.extend(dependency_mtimes)
+
+    return mtimes
+
+def _get_template_dependencies(path, mtime):
+    # names of the templates extended or included by the template. None in
+    # case some of them is given by a variable.
+    cached_mtime, dependencies = _template_dependencies.get(path, (None, None))
+
+    if cached_mtime == mtime:
+        return dependencies
+
+    try:
+        with open(path) as f:
+            source = f.read()
+    except IOError:
+        return None
+
+    dependencies = []
+
+    for name in _DEPENDENCY.findall(source):
+        if len(name) < 2 or name[0] not in '"\'' or name[-1] != name[0]:
+            dependencies = None
+
+            break
+
+        dependencies.append(name[1:-1])
+
+    _template_dependencies[path] = (mtime, dependencies)
+
+    return dependencies
+
+def _find_template(template_name):
+    for loader_name in settings.TEMPLATE_LOADERS:
+        loader = find_template_loader(loader_name)
+
+        for loader in getattr(loader, 'loaders', [loader]):
+            if not hasattr(loader, 'get_template_sources'):
+                continue
+
+            for path in loader.get_template_sources(template_name):
+                if os.path.isfile(path):
+                    return path
@@ -28,7 +28,10 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+from django.conf import settings
+
 LOCAL_VARIABLES = 'local_variables'
+LOCAL_VARIABLES_ORDER = 'local_variables_order'
 
 def set_variable(request, key, value):
     '''
@@ -38,12 +41,87 @@ def set_variable(request, key, value):
     @param key: key of the variable
     @param value: value of the variable
     '''
-    if LOCAL_VARIABLES not in request.session:
-        request.session[LOCAL_VARIABLES] = {}
-    
-    if type(value) is list and len(value) == 1 and key[-2:] != '[]':
-        value = value[0]
-    
-    request.session[LOCAL_VARIABLES][key] = value
-    # this needs to be set so that Django saves the modification!
-    request.session.modified = True 
+    update_variables(request, ((key, value), ))
+
+def update_variables(request, items):
+    '''
+    Sets multiple local session variables at once. The session is marked
+    modified only in case some value actually changed. At most
+    settings.NAVIGATION_LOCAL_VARIABLES_LIMIT (default 100) variables are
+    stored. The least recently used ones, that is, the ones not sent for the
+    longest time, are removed first. This applies to the variables given in
+    the same call as well, the last ones of them are the most recent.
+
+    @param request: request to set local session variables in
+    @param items: iterable of (key, value) pairs
+
+    >>> class Session(dict):
+    ...     modified = False
+    >>> class Request(object):
+    ...     def __init__(self):
+    ...         self.session = Session()
+    >>>
+    >>> request = Request()
+    >>> update_variables(request, [('a', '1'), ('b', ['2'])])
+    >>> request.session[LOCAL_VARIABLES] == {'a': '1', 'b': '2'}
+    True
+    >>> request.session.modified = False
+    >>> update_variables(request, [('a', '1')])
+    >>> request.session.modified
+    False
+    >>> update_variables(request, [('a', '3')])
+    >>> request.session.modified
+    True
+    >>>
+    >>> settings.NAVIGATION_LOCAL_VARIABLES_LIMIT = 2
+    >>> request = Request()
+    >>> for key in ('a', 'b', 'a', 'c'):
+    ...     update_variables(request, [(key, '1')])
+    >>> sorted(request.session[LOCAL_VARIABLES])
+    ['a', 'c']
+    >>> update_variables(request, [('x', '1'), ('y', '1'), ('z', '1')])
+    >>> sorted(request.session[LOCAL_VARIABLES])
+    ['y', 'z']
+    >>> del settings.NAVIGATION_LOCAL_VARIABLES_LIMIT
+    '''
+    variables = request.session.get(LOCAL_VARIABLES, {})
+    order = request.session.get(LOCAL_VARIABLES_ORDER, [])
+    changed = False
+
+    for key, value in items:
+        if type(value) is list and len(value) == 1 and key[-2:] != '[]':
+            value = value[0]
+
+        # unchanged keys are moved as well. The order is saved along with
+        # the next change.
+        if key in order:
+            order.remove(key)
+
+        order.append(key)
+
+        if key not in variables or variables[key] != value:
+            variables[key] = value
+            changed = True
+
+    if changed:
+        _evict(variables, order)
+
+        request.session[LOCAL_VARIABLES] = variables
+        request.session[LOCAL_VARIABLES_ORDER] = order
+        # this needs to be set so that Django saves the modification!
+        request.session.modified = True
+
+def _evict(variables, order):
+    limit = getattr(settings, 'NAVIGATION_LOCAL_VARIABLES_LIMIT', 100)
+
+    if len(order) != len(variables):
+        # variables set before their order was tracked are considered oldest
+        tracked = set(order)
+        order[:] = [key for key in variables if key not in tracked] + \
+            [key for key in order if key in variables]
+
+    if limit is not None and len(order) > limit:
+        for key in order[:len(order) - limit]:
+            del variables[key]
+
+        del order[:len(order) - limit]
@@ -1,5 +1,57 @@
 # -*- coding: utf-8 -*-
 
+from django.conf import settings
+from django.utils import translation
+
+LANGUAGE_SESSION_KEY = 'django_language'
+PREVIOUS_LANGUAGE = '_navigation_previous_language'
+
+def language_from_url():
+    '''
+    Tells whether the language of a page is determined by its url instead of
+    the session. See settings.NAVIGATION_LANGUAGE_FROM_URL.
+
+    @return: returns True in case the language comes from the url
+    '''
+    return getattr(settings, 'NAVIGATION_LANGUAGE_FROM_URL', False)
+
+def activate(request, language):
+    '''
+    Activates language for the rest of the request without touching the
+    session. The previously active language is restored by restore.
+
+    @param request: request to activate language for
+    @param language: code of the language
+    '''
+    if not hasattr(request, PREVIOUS_LANGUAGE):
+        setattr(request, PREVIOUS_LANGUAGE, translation.get_language())
+
+    translation.activate(language)
+    request.LANGUAGE_CODE = language
+
+def restore(request):
+    '''
+    Restores the language that was active before activate was called.
+
+    @param request: request the language was activated for
+    '''
+    if hasattr(request, PREVIOUS_LANGUAGE):
+        translation.activate(getattr(request, PREVIOUS_LANGUAGE))
+        delattr(request, PREVIOUS_LANGUAGE)
+
+def get_active_language():
+    return translation.get_language()
+
+def switch_language(request, language):
+    '''
+    Stores language explicitly selected by the user in the session.
+
+    @param request: request to store language in
+    @param language: code of the language
+    '''
+    if request.session.get(LANGUAGE_SESSION_KEY) != language:
+        request.session[LANGUAGE_SESSION_KEY] = language
+
 def set_language(request):
     '''
     Sets session variable containing language to use based on the user setting.
@@ -10,7 +62,7 @@ def set_language(request):
     #user_profile = UserProfile.get(request.user)
 
     # XXX: hack. figure out how to fetch this from actual user (move to app?)
-    request.session['django_language'] = 'fi' # user_profile.language
+    request.session[LANGUAGE_SESSION_KEY] = 'fi' # user_profile.language
 
 def get_language(request):
     '''
@@ -20,7 +72,7 @@ def get_language(request):
     @param request: request to fetch language from
     @return: returns the selected language of the user
     '''
-    if 'django_language' not in request.session:
+    if LANGUAGE_SESSION_KEY not in request.session:
         set_language(request)
 
-    return request.session['django_language']
+    return request.session[LANGUAGE_SESSION_KEY]
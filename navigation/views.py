@@ -29,43 +29,211 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 #from logging import debug
-from django.http import HttpResponseForbidden, HttpResponseRedirect
-from utils.http import default_response
-from utils.session import set_variable
+from django.conf import settings
+from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
+from instrumentation import get_timer
+from utils.auth import get_group_names
+from utils.http import conditional_response, default_response
+from utils.session import LOCAL_VARIABLES, update_variables
 from structure import Navigation
 from utils import translation
 
 
+ACCESS_MASK = '_navigation_access_mask'
+NODE = 'navigation_node'
+LANGUAGE = 'navigation_language'
+MIDDLEWARE = '_navigation_middleware'
+
+def get_node_and_language(request):
+    '''
+    Returns navigation node of the requested path and the language of the
+    path. These are looked up once per request and stored in
+    request.navigation_node and request.navigation_language. See
+    middleware.NavigationMiddleware.
+
+    In case the path is the same in several languages, the language of the
+    session or the active language is preferred over the one in the index.
+
+    @param request: request to look up node for
+    @return: returns (node, language) tuple or (None, None) if not found
+
+    >>> import sys
+    >>> from django.test.client import RequestFactory
+    >>> from django.utils.translation import override
+    >>> structure = sys.modules[Navigation.__module__]
+    >>>
+    >>> navigation = structure._Navigation()
+    >>> primary = structure.NavigationStructure('primary')
+    >>> primary.children.append(structure.Page(structure.Translated(None,
+    ...     {'en': u'blog', 'fi': u'blog'}), None))
+    >>> primary.children.append(structure.Page(structure.Translated(None,
+    ...     {'en': u'gallery', 'fi': u'galleria'}), None))
+    >>> navigation.children.append(primary)
+    >>> navigation._changed()
+    >>> old_navigation, structure._navigation = structure._navigation, navigation
+    >>>
+    >>> def get_language(path, active, session=None):
+    ...     request = RequestFactory().get(path)
+    ...     if session is not None:
+    ...         request.session = session
+    ...     with override(active):
+    ...         return get_node_and_language(request)[1]
+    >>> get_language('/blog/', 'en'), get_language('/blog/', 'fi')
+    ('en', 'fi')
+    >>> get_language('/blog/', 'en', {'django_language': 'fi'})
+    'fi'
+    >>> get_language('/gallery/', 'fi', {'django_language': 'fi'})
+    'en'
+    >>>
+    >>> structure._navigation = old_navigation
+    '''
+    if not hasattr(request, NODE):
+        node, language = Navigation().find_node_and_language(request.path)
+
+        if node is not None:
+            language = _preferred_language(request, node, language)
+
+        setattr(request, NODE, node)
+        setattr(request, LANGUAGE, language)
+
+    return getattr(request, NODE), getattr(request, LANGUAGE)
+
+def _preferred_language(request, node, language):
+    url = request.path.strip('/')
+    languages = [code for code, node_url in node.url.items() if node_url == url]
+
+    if len(languages) < 2:
+        return language
+
+    candidates = [translation.get_active_language()]
+
+    # the session is consulted only for the ambiguous paths
+    if hasattr(request, 'session'):
+        candidates.insert(0,
+            request.session.get(translation.LANGUAGE_SESSION_KEY))
+
+    for candidate in candidates:
+        if candidate in languages:
+            return candidate
+
+    return language
+
+def get_access_mask(request):
+    '''
+    Returns access mask of the user of the request. The mask is calculated
+    once per request and navigation version.
+
+    @param request: request to calculate access mask for
+    @return: returns mask to match against access_mask of nodes
+    '''
+    navi = Navigation()
+    version, mask = getattr(request, ACCESS_MASK, (None, 0))
+
+    if version != navi.version:
+        mask = navi.get_access_mask(get_group_names(request))
+        setattr(request, ACCESS_MASK, (navi.version, mask))
+
+    return mask
+
+def get_page_language(request):
+    '''
+    Returns language of the requested page. The language is taken from the
+    url in case settings.NAVIGATION_LANGUAGE_FROM_URL is set and from the
+    session otherwise. For urls that are not navigation pages the active
+    language is used in the former case.
+
+    @param request: request to return language of
+    @return: returns code of the language
+    '''
+    if translation.language_from_url():
+        node, language = get_node_and_language(request)
+
+        return language or translation.get_active_language()
+
+    return translation.get_language(request)
+
 def user_is_authorized_to_access(request, node):
-    if node.exclusive_to:
-        for group_name in node.exclusive_to:
-            belongs_to_group = request.user.groups.filter(name=group_name).count()
+    '''
+    Checks whether the user of the request belongs to one of the groups the
+    node is exclusive to. Nodes having no access mask are open to all.
 
-            if belongs_to_group:
-                return True
-    else:
-        return True
+    @param request: request of the user
+    @param node: node to check access to
+    @return: returns True if the user is authorized to access the node
+
+    >>> import sys
+    >>> from django.test.client import RequestFactory
+    >>> from utils.auth import GROUP_NAMES
+    >>> structure = sys.modules[Navigation.__module__]
+    >>>
+    >>> navigation = structure._Navigation()
+    >>> primary = structure.NavigationStructure('primary')
+    >>> primary.children.append(structure.Base(structure.Translated(None,
+    ...     {'en': u'blog'}), ('editors', )))
+    >>> primary.children.append(structure.Base(structure.Translated(None,
+    ...     {'en': u'help'}), ()))
+    >>> navigation.children.append(primary)
+    >>> navigation._changed()
+    >>> old_navigation, structure._navigation = structure._navigation, navigation
+    >>> blog, help = primary.children
+    >>>
+    >>> def authorized(group_names, node):
+    ...     request = RequestFactory().get('/')
+    ...     setattr(request, GROUP_NAMES, frozenset(group_names))
+    ...     return user_is_authorized_to_access(request, node)
+    >>> authorized(['editors'], blog), authorized(['editors'], help)
+    (True, True)
+    >>> authorized(['others'], blog), authorized([], help)
+    (False, True)
+    >>>
+    >>> structure._navigation = old_navigation
+    '''
+    if node.access_mask:
+        return bool(node.access_mask & get_access_mask(request))
+
+    return True
 
-def fetch_get_params(request, get_items):
-    if request.method == 'GET':
-        if get_items:
-            kv_pairs = get_items.split('&')
+def fetch_get_params(request, get_items, parameters=None):
+    if request.method == 'GET' and get_items:
+        update_variables(request,
+            filter_params(parse_get_params(get_items), parameters))
 
-            for pair in kv_pairs:
-                try:
-                    k, v = pair.split('=')
-                except:
-                    continue
+def parse_get_params(get_items):
+    '''
+    Parses query string into (key, value) pairs. Malformed pairs are skipped
+    and "null" values are converted to None.
 
-                if v == 'null':
-                    v = None
+    @param get_items: query string to parse
+    @return: yields (key, value) pairs
+    '''
+    for pair in get_items.split('&'):
+        try:
+            k, v = pair.split('=')
+        except ValueError:
+            continue
 
-            set_variable(request, k, v)
+        if v == 'null':
+            v = None
 
-def fetch_post_params(request):
-    if request.method == 'POST':
-        for key, value in request.POST.iteritems():
-            set_variable(request, key, value)
+        yield k, v
+
+def fetch_post_params(request, parameters=None):
+    if request.method == 'POST' and request.POST:
+        update_variables(request,
+            filter_params(request.POST.iteritems(), parameters))
+
+def filter_params(items, parameters):
+    '''
+    Filters out parameters not declared by the page.
+
+    @param items: iterable of (key, value) pairs
+    @param parameters: names of the parameters to keep. None keeps all.
+    @return: returns iterable of (key, value) pairs
+    '''
+    if parameters is None:
+        return items
+
+    return ((key, value) for key, value in items if key in parameters)
 
 def url_is_translatable(url, node, lang):
     return node.url[lang] != url.strip('/')
@@ -74,6 +242,19 @@ def translate_url(node, lang):
     return HttpResponseRedirect('/' + node.url[lang])
 
 def page(request, template_name, forbidden_page):
+    timer = get_timer(request)
+
+    try:
+        return _page(request, template_name, forbidden_page, timer)
+    finally:
+        # NavigationMiddleware restores the language after the response has
+        # been rendered
+        if not getattr(request, MIDDLEWARE, False):
+            translation.restore(request)
+
+        timer.finish(request)
+
+def _page(request, template_name, forbidden_page, timer):
     request_path = request.get_full_path()
 
     parts = request_path.split('?')
@@ -85,20 +266,49 @@ def page(request, template_name, forbidden_page):
         base_url = request_path
         get_params = None
 
-    navi = Navigation()
-    node = navi.find_node(base_url)
+    node, url_lang = get_node_and_language(request)
+    timer.mark('find_node')
+
+    if node is None:
+        raise Http404
+
+    authorized = user_is_authorized_to_access(request, node)
+    timer.mark('authorization')
 
-    if not user_is_authorized_to_access(request, node):
+    if not authorized:
         return HttpResponseForbidden(forbidden_page)
 
-    fetch_get_params(request, get_params)
-    fetch_post_params(request)
+    fetch_get_params(request, get_params, node.parameters)
+    fetch_post_params(request, node.parameters)
+    timer.mark('parameters')
 
-    lang = translation.get_language(request)
-    if url_is_translatable(base_url, node, lang):
-        return translate_url(node, lang)
+    if translation.language_from_url():
+        # the url is always in its own language so there is nothing to redirect
+        lang = url_lang
+        translation.activate(request, lang)
+        timer.mark('language')
+    else:
+        lang = translation.get_language(request)
+        timer.mark('language')
+
+        if url_is_translatable(base_url, node, lang):
+            response = translate_url(node, lang)
+            timer.mark('redirect')
+
+            return response
 
     if node.view:
-        return node.view(request, template_name)
+        response = node.view(request, template_name)
+    elif getattr(settings, 'NAVIGATION_CONDITIONAL', False):
+        navi = Navigation()
+        local_variables = sorted(request.session.get(LOCAL_VARIABLES,
+            {}).items())
+        response = conditional_response(request, template_name,
+            (navi.digest, lang, get_access_mask(request), local_variables),
+            navi.modified)
+    else:
+        response = default_response(request, template_name)
+
+    timer.mark('render')
 
-    return default_response(request, template_name)
+    return response
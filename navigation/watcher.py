@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Automatic reparsing of changed navigation.
+"""
+"""
+Copyright (c) 2008, Heikki Heikkinen, Mikko Tyrväinen, Juho Vepsäläinen and
+Tuomas Vihinen. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+    * Redistributions of source code must retain the above copyright
+      notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright
+      notice, this list of conditions and the following disclaimer in the
+      documentation and/or other materials provided with the distribution.
+    * Neither the name of the <organization> nor the
+      names of its contributors may be used to endorse or promote products
+      derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY <copyright holder> ``AS IS'' AND ANY
+EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL <copyright holder> BE LIABLE FOR ANY
+DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import threading
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None # falls back to polling
+
+
+def _file_states(path, recursive):
+    ret = []
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+
+        for file_name in sorted(files):
+            if file_name.endswith('.py'):
+                stat = os.stat(os.path.join(root, file_name))
+                ret.append((root, file_name, stat.st_mtime, stat.st_size))
+
+        if not recursive:
+            break
+
+    return ret
+
+
+def _restore_state(states, old_states, navi_name, folder_name):
+    if folder_name is None:
+        if navi_name in old_states:
+            states[navi_name] = old_states[navi_name]
+        else:
+            del states[navi_name]
+
+        return
+
+    old_bases = old_states.get(navi_name, (None, {}))[1]
+    bases = states[navi_name][1]
+
+    if folder_name in old_bases:
+        bases[folder_name] = old_bases[folder_name]
+    else:
+        del bases[folder_name]
+
+
+class Watcher(object):
+    '''
+    Watches the app of a navigation for changes and reparses the affected
+    navigation structures and bases. Uses inotify (pyinotify) if it is
+    available and polls modification times otherwise.
+    '''
+    def __init__(self, navigation, interval=1.0):
+        '''
+        @param navigation: navigation to keep up to date
+        @param interval: polling interval in seconds. In case inotify is
+        used, this is the time to wait for further events before reparsing.
+        '''
+        self.navigation = navigation
+        self.interval = interval
+
+        self._states = self._scan()
+        self._event = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._notifier = None
+        self._pid = None
+
+    @property
+    def running(self):
+        '''
+        Tells whether the watcher is running in the current process. Threads
+        do not survive fork so this is False in forked children.
+        '''
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def start(self):
+        self._pid = os.getpid()
+
+        if pyinotify is not None:
+            self._notifier = self._start_notifier()
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._event.set()
+
+        if self._notifier is not None:
+            self._notifier.stop()
+
+    def check(self):
+        '''
+        Reparses the parts of the navigation that have changed since the
+        previous check.
+
+        @return: returns list of (structure name, base name) tuples that were
+        reparsed. Base name is None in case the whole structure was reparsed.
+        Changes that fail to reparse are left out and retried on the next
+        check.
+
+        >>> import shutil, tempfile
+        >>> class FakeNavigation(object):
+        ...     fail = False
+        ...     def reparse_structure(self, navi_name):
+        ...         pass
+        ...     def reparse_base(self, navi_name, folder_name):
+        ...         if self.fail:
+        ...             raise SyntaxError('invalid syntax')
+        >>> navigation = FakeNavigation()
+        >>> navigation._path = tempfile.mkdtemp()
+        >>> os.makedirs(os.path.join(navigation._path, 'main', 'home'))
+        >>> watcher = Watcher(navigation)
+        >>> watcher.check()
+        []
+        >>> open(os.path.join(navigation._path, 'main', 'home', 'a.py'),
+        ...     'w').close()
+        >>> navigation.fail = True
+        >>> watcher.check()
+        Reparse fail! invalid syntax main home
+        []
+        >>> navigation.fail = False
+        >>> watcher.check()
+        [('main', 'home')]
+        >>> watcher.check()
+        []
+        >>> shutil.rmtree(navigation._path)
+        '''
+        states = self._scan()
+        changes = []
+
+        for navi_name in set(states) | set(self._states):
+            old_structure, old_bases = self._states.get(navi_name, (None, {}))
+            new_structure, new_bases = states.get(navi_name, (None, {}))
+
+            if old_structure != new_structure:
+                changes.append((navi_name, None))
+
+                continue
+
+            for folder_name in set(old_bases) | set(new_bases):
+                if old_bases.get(folder_name) != new_bases.get(folder_name):
+                    changes.append((navi_name, folder_name))
+
+        done = []
+
+        for navi_name, folder_name in changes:
+            try:
+                if folder_name is None:
+                    self.navigation.reparse_structure(navi_name)
+                else:
+                    self.navigation.reparse_base(navi_name, folder_name)
+            except Exception, e:
+                print 'Reparse fail!', e, navi_name, folder_name # XXX: log instead
+
+                # keep the old state so that the change is retried on the
+                # next check
+                _restore_state(states, self._states, navi_name, folder_name)
+            else:
+                done.append((navi_name, folder_name))
+
+        self._states = states
+
+        return done
+
+    def _run(self):
+        while not self._stopped:
+            if self._notifier is not None:
+                self._event.wait()
+                self._event.clear()
+
+                # give editors and deploy scripts time to finish writing
+                self._event.wait(self.interval)
+                self._event.clear()
+            else:
+                self._event.wait(self.interval)
+
+            if not self._stopped:
+                try:
+                    self.check()
+                except Exception, e:
+                    print 'Watch fail!', e # XXX: log instead
+
+    def _scan(self):
+        # structure state consists of its own modules and list of its
+        # packages. Bases are tracked separately so that changes made to them
+        # can be reparsed without touching the rest of the structure.
+        ret = {}
+        path = self.navigation._path
+
+        for navi_name in os.listdir(path):
+            navi_path = os.path.join(path, navi_name)
+
+            if not os.path.isdir(navi_path):
+                continue
+
+            folder_names = sorted(name for name in os.listdir(navi_path)
+                if os.path.isdir(os.path.join(navi_path, name)))
+            bases = dict((name, _file_states(os.path.join(navi_path, name),
+                recursive=True)) for name in folder_names)
+
+            ret[navi_name] = (_file_states(navi_path, recursive=False) +
+                folder_names, bases)
+
+        return ret
+
+    def _start_notifier(self):
+        event = self._event
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, e):
+                if e.dir or e.name.endswith('.py'):
+                    event.set()
+
+        mask = pyinotify.IN_CREATE | pyinotify.IN_DELETE | \
+            pyinotify.IN_MODIFY | pyinotify.IN_MOVED_FROM | \
+            pyinotify.IN_MOVED_TO | pyinotify.IN_CLOSE_WRITE
+
+        watch_manager = pyinotify.WatchManager()
+        watch_manager.add_watch(self.navigation._path, mask, rec=True,
+            auto_add=True)
+
+        notifier = pyinotify.ThreadedNotifier(watch_manager, Handler())
+        notifier.setDaemon(True)
+        notifier.start()
+
+        return notifier